@@ -1,10 +1,15 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
-import tempfile
+import time
 import uuid
 import logging
-from utils import get_summarization, get_image_prompts, segments_to_chunks, generate_images, generate_video
+from audio_ingest import ingest_upload, release_session_audio
+from hls_stream import player_html, release_session_streams
+from job_queue import JobQueueFull, get_job_queue, submit_render_job, submit_scene_rerender_job
+from scene_artifacts import release_session_segments
 import constants  
+import instrumentation
 from groq import Groq
 
 # Set up logging
@@ -20,12 +25,18 @@ if 'session_id' not in st.session_state:
 
 session_id = st.session_state.session_id
 
+# Tag every stage recorded during this script run with the session
+instrumentation.bind_session(session_id)
+instrumentation.start_metrics_server()
+instrumentation.start_metrics_writer()
+
 # Initialize state variables if not already set
 state_variables = [
     'transcript_visible', 'uploaded_file_name', 
     'audio', 'was_converted', 'transcript', 
     'generated_video', 'image_prompts', 'generated_images', 'video_generated',
-    'summary'  # Added summary state variable
+    'summary',  # Added summary state variable
+    'scenes', 'job_id', 'video_renditions'
 ]
 
 for var in state_variables:
@@ -52,105 +63,108 @@ else:
 
 logger.debug(f"Audio option selected: {audio_option}")
 
+poll_job = False
+
 if audio_file:
     logger.info(f"Audio file received: {audio_file.name}")
 
     # Reset states only when a new file is uploaded
     if st.session_state[f'uploaded_file_name_{session_id}'] != audio_file.name:
         st.session_state[f'uploaded_file_name_{session_id}'] = audio_file.name
-        st.session_state[f'audio_{session_id}'] = audio_file
+        # Stop the previous upload's render before its files are released, so it frees its worker and encode slot
+        if st.session_state[f'job_id_{session_id}']:
+            get_job_queue().cancel(st.session_state[f'job_id_{session_id}'])
+        # Written to disk once; every later stage and rerun uses this file
+        ingested_audio = ingest_upload(audio_file, session_id)
+        release_session_audio(session_id, keep=ingested_audio)
+        release_session_streams(session_id)
+        release_session_segments(session_id)
+        st.session_state[f'audio_{session_id}'] = ingested_audio
+        st.session_state[f'job_id_{session_id}'] = None  # A new upload gets a new render job
         st.session_state[f'transcript_{session_id}'] = None
+        st.session_state[f'summary_{session_id}'] = None
+        st.session_state[f'scenes_{session_id}'] = None
         st.session_state[f'image_prompts_{session_id}'] = None
         st.session_state[f'generated_images_{session_id}'] = None  # Reset image generation state
         st.session_state[f'generated_video_{session_id}'] = None  # Reset generated video state
+        st.session_state[f'video_renditions_{session_id}'] = None
         st.session_state[f'video_generated_{session_id}'] = False  # Reset video generated flag
         logger.info("State variables reset due to new audio file upload.")
 
-    # Read the uploaded file's bytes and send to Groq API for transcription
-    file_bytes = audio_file.read()
-    logger.debug("Audio file bytes read successfully.")
-
-    # Create a transcription of the audio file using Groq API
-    try:
-        result = client.audio.transcriptions.create(
-            file=(audio_file.name, file_bytes),  # Send the audio file content directly to the API
-            model="whisper-large-v3-turbo",  # Model to use for transcription
-            prompt="Take Note of Overall Context of the Audio",  # Optional context for better transcription accuracy
-            response_format="verbose_json",  # Return detailed JSON response
-            temperature=0.0,  # Control randomness in the transcription output
-        )
-        st.session_state[f'transcript_{session_id}'] = result.text
-        st.session_state[f'segments_{session_id}'] = result.segments
-        logger.info("Transcription created successfully.")
-    except Exception as e:
-        logger.error(f"Error during transcription: {e}")
-        st.error("An error occurred during transcription.")
-
-    st.audio(st.session_state[f'audio_{session_id}'], format=f"audio/{audio_file.type}")
+    st.audio(st.session_state[f'audio_{session_id}'].path, format=f"audio/{audio_file.type}")
+
+    # The whole render runs as a background job; this script only submits it once and then polls it,
+    # so reruns never restart a stage and a busy server queues work instead of thrashing
+    if st.session_state[f'job_id_{session_id}'] is None:
+        try:
+            st.session_state[f'job_id_{session_id}'] = submit_render_job(session_id, st.session_state[f'audio_{session_id}'], client)
+        except JobQueueFull:
+            logger.warning("Render queue is full, retrying shortly.")
+            st.warning("The server is busy right now, your video will start as soon as a slot frees up.")
+            poll_job = True
+
+    job = get_job_queue().status(st.session_state[f'job_id_{session_id}']) if st.session_state[f'job_id_{session_id}'] else None
+    result = job["result"] if job else {}
+
+    # Publish artifacts to the session as soon as the job produces them
+    if result.get("transcript") is not None:
+        st.session_state[f'transcript_{session_id}'] = result["transcript"]
+        st.session_state[f'segments_{session_id}'] = result["segments"]
+        st.session_state[f'scenes_{session_id}'] = result["scenes"]
+    if result.get("image_prompts") is not None:
+        st.session_state[f'summary_{session_id}'] = result["summary"]
+        st.session_state[f'image_prompts_{session_id}'] = result["image_prompts"]
+    if result.get("images") is not None:
+        st.session_state[f'generated_images_{session_id}'] = [
+            (image["prompt"], image["path"] or image["error"]) for image in result["images"]
+        ]
 
     # Toggle transcript visibility
     toggle_transcript = st.checkbox("Show Transcript", value=st.session_state[f'transcript_visible_{session_id}'], key="toggle_transcript")
     st.session_state[f'transcript_visible_{session_id}'] = toggle_transcript
 
-    if st.session_state[f'transcript_visible_{session_id}']:
+    if st.session_state[f'transcript_visible_{session_id}'] and st.session_state[f'transcript_{session_id}']:
         st.write("### Transcription:")
         st.write(st.session_state[f'transcript_{session_id}'])
 
-    # Summarization logic (not displayed on UI)
-    if st.session_state[f'transcript_{session_id}'] and st.session_state[f'summary_{session_id}'] is None:
-        with st.spinner("Generating summary... Please wait."):
-            st.session_state[f'summary_{session_id}'] = get_summarization(st.session_state[f'transcript_{session_id}'])
-            logger.info("Summary generated successfully.")
-
-    # Image generation logic
-    if st.session_state[f'transcript_{session_id}'] and st.session_state[f'image_prompts_{session_id}'] is None:
-        with st.spinner("Generating image prompts... Please wait."):
-            st.session_state[f'image_prompts_{session_id}'] = get_image_prompts(
-                segments_to_chunks(st.session_state[f'segments_{session_id}']),
-                st.session_state[f'summary_{session_id}']
-            )['image_prompts']
-            logger.info("Image prompts generated successfully.")
-
-    # Ensure that generated_images is always a list
-    if f'generated_images_{session_id}' not in st.session_state or st.session_state[f'generated_images_{session_id}'] is None:
-        st.session_state[f'generated_images_{session_id}'] = []
-
-    # Generate images only if they have not been generated already
-    if st.session_state[f'image_prompts_{session_id}'] and not st.session_state[f'generated_images_{session_id}']:
-        progress_placeholder = st.empty()
-        progress_bar = st.progress(0)
-        total_images = len(st.session_state[f'image_prompts_{session_id}'])
-        progress_placeholder.text(f"Generating images. Please be patient...")
-        
-        for idx, (prompt, image_path) in enumerate(generate_images(st.session_state[f'image_prompts_{session_id}'])):
-            st.session_state[f'generated_images_{session_id}'].append((prompt, image_path))
-            progress = (idx + 1) / total_images
-            progress_bar.progress(progress)
-            progress_placeholder.text(f"Generated image {idx + 1} of {total_images}: {prompt[:50]}...")
-        
-        progress_placeholder.text("✅ All images generated successfully!")
-        progress_bar.empty()
-        logger.info("All images generated successfully.")
-
-    # Generate video when all images are generated
-    if st.session_state[f'generated_images_{session_id}'] and st.session_state[f'audio_{session_id}'] and not st.session_state[f'video_generated_{session_id}']:
-        with st.spinner("Generating video... Please wait."):
-            # Create a temporary directory for the video
-            temp_dir = tempfile.gettempdir()
-            video_filename = f"generated_video_{session_id}.mp4"
-            video_path = os.path.join(temp_dir, video_filename)
-
-            # Map images to segments
-            image_paths = [img[1] for img in st.session_state[f'generated_images_{session_id}']]
-            generated_video_path = generate_video(
-                audio_file=st.session_state[f'audio_{session_id}'], 
-                images=image_paths, 
-                segments=st.session_state[f'segments_{session_id}']
-            )
-            st.session_state[f'generated_video_{session_id}'] = generated_video_path
-            st.session_state[f'video_generated_{session_id}'] = True  # Set the flag to True
-            st.success("Video generated successfully!")
-            logger.info("Video generated successfully.")
+    if job and job["state"] in ("queued", "running"):
+        st.progress(job["progress"])
+        if job["state"] == "queued":
+            st.text(f"{job['message']} ({get_job_queue().pending()} jobs in the queue)")
+        else:
+            st.text(job["message"])
+
+        # Scenes are playable as soon as the first few are encoded, while the rest still render
+        if result.get("stream_url") and result["stream_segments"] >= min(constants.STREAM_MIN_SEGMENTS, result["stream_total"]):
+            st.caption(f"Preview: {result['stream_segments']} of {result['stream_total']} scenes ready")
+            components.html(player_html(result["stream_url"]), height=380)
+        poll_job = True
+
+    elif job and job["state"] == "failed":
+        logger.error(f"Render job {job['id']} failed: {job['error']}")
+        st.error("An error occurred while generating the video.")
+        if job.get("source_job_id"):
+            # A failed scene edit leaves the video it started from untouched
+            if st.button("Back to the previous video"):
+                st.session_state[f'job_id_{session_id}'] = job["source_job_id"]
+                st.session_state[f'video_generated_{session_id}'] = False
+                st.rerun()
+        elif st.button("Try again"):
+            st.session_state[f'job_id_{session_id}'] = None
+            st.rerun()
+
+    elif job and job["state"] == "done" and not st.session_state[f'video_generated_{session_id}']:
+        st.session_state[f'generated_video_{session_id}'] = result["video_path"]
+        st.session_state[f'video_renditions_{session_id}'] = result.get("renditions") or {}
+        st.session_state[f'video_generated_{session_id}'] = True
+        logger.info(f"Render job {job['id']} finished: {job['stage_seconds']}")
+
+        failed_images = [image for image in result.get("images", []) if image["error"]]
+        if failed_images:
+            st.warning(f"⚠️ {len(failed_images)} of {len(result['images'])} images failed, neighbouring images were reused.")
+            logger.warning(f"{len(failed_images)} of {len(result['images'])} images failed to generate.")
+        else:
+            logger.info("All images generated successfully.")
 
     # Display the generated video
     if st.session_state[f'generated_video_{session_id}']:
@@ -165,8 +179,52 @@ if audio_file:
                 mime="video/mp4"
             )
 
+        # The extra sizes come out of the same encode, one download button each
+        for name, rendition_path in (st.session_state[f'video_renditions_{session_id}'] or {}).items():
+            if not os.path.exists(rendition_path):
+                continue
+            with open(rendition_path, "rb") as file:
+                st.download_button(
+                    label=f"Download {name} version",
+                    data=file,
+                    file_name=f"generated_video_{session_id}_{name}.mp4",
+                    mime="video/mp4",
+                    key=f"download_{name}_{session_id}",
+                )
+
+        # Fixing one scene regenerates only its image and segment, the rest of the video is reused
+        if job and job["state"] == "done" and result.get("scene_manifest"):
+            with st.expander("✏️ Edit scenes"):
+                images = result.get("images") or []
+                for index, scene in enumerate(result["scenes"]):
+                    image = images[index] if index < len(images) else None
+                    st.markdown(f"**Scene {index + 1}** ({scene['start']:.1f}s - {scene['end']:.1f}s): {scene['text']}")
+                    image_column, prompt_column = st.columns([1, 2])
+                    if image and image["path"] and os.path.exists(image["path"]):
+                        image_column.image(image["path"])
+                    prompt = prompt_column.text_area(
+                        "Image prompt", value=image["prompt"] if image else "", key=f"prompt_{job['id']}_{index}"
+                    )
+                    apply_column, regenerate_column = prompt_column.columns(2)
+                    apply = apply_column.button("Apply prompt", key=f"apply_{job['id']}_{index}")
+                    regenerate = regenerate_column.button("Regenerate image", key=f"regenerate_{job['id']}_{index}")
+                    if (apply or regenerate) and prompt.strip():
+                        try:
+                            st.session_state[f'job_id_{session_id}'] = submit_scene_rerender_job(
+                                session_id, job["id"], index, prompt.strip(), regenerate=regenerate
+                            )
+                        except JobQueueFull:
+                            st.warning("The server is busy right now, please try again in a moment.")
+                        else:
+                            logger.info(f"Re-rendering scene {index} of job {job['id']}")
+                            st.session_state[f'video_generated_{session_id}'] = False
+                            st.rerun()
+
 else:
     st.warning("Please upload an audio file to proceed.")
     logger.warning("No audio file uploaded.")
 
-
+# Poll a queued or running job by rerunning the script shortly
+if poll_job:
+    time.sleep(constants.JOB_POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+_COPY_CHUNK_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class IngestedAudio:
+    """
+    An audio file on disk, identified by the SHA-256 of its content.
+    """
+    path: str
+    name: str
+    sha256: str
+    size: int
+
+    @contextmanager
+    def buffer(self):
+        """
+        Memory-map the file read-only, so its bytes can be hashed or sent without a copy on the heap.
+        """
+        with open(self.path, "rb") as f:
+            if self.size == 0:
+                yield b""
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+
+def session_audio_dir(session_id: str) -> str:
+    return os.path.join(constants.AUDIO_INGEST_DIR, session_id)
+
+
+def ingest_upload(upload, session_id: str) -> IngestedAudio:
+    """
+    Stream an uploaded file into the session's audio folder once, hashing it while writing.
+
+    The file is stored as `<sha256><ext>`, so uploading the same audio again, or a
+    rerun of the script, finds the existing file instead of writing another copy.
+
+    :param upload: File-like object with a `name`, such as Streamlit's `UploadedFile`
+    :param session_id: Session owning the file
+    :return: The ingested audio
+    """
+    directory = session_audio_dir(session_id)
+    os.makedirs(directory, exist_ok=True)
+    extension = os.path.splitext(upload.name)[1].lower()
+
+    # Rewind in case the upload was already read
+    if hasattr(upload, "seek"):
+        upload.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = upload.read(_COPY_CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        path = os.path.join(directory, f"{digest.hexdigest()}{extension}")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    logger.info(f"Ingested {upload.name} ({size} bytes) as {path}")
+    return IngestedAudio(path=path, name=upload.name, sha256=digest.hexdigest(), size=size)
+
+
+def ingest_path(path: str) -> IngestedAudio:
+    """
+    Describe an audio file already on disk, hashing it in place without copying it.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return IngestedAudio(path=path, name=os.path.basename(path), sha256=digest.hexdigest(), size=os.path.getsize(path))
+
+
+def release_session_audio(session_id: str, keep: IngestedAudio = None):
+    """
+    Delete the session's ingested audio, except `keep`.
+    """
+    directory = session_audio_dir(session_id)
+    if not os.path.isdir(directory):
+        return
+    if keep is None:
+        shutil.rmtree(directory, ignore_errors=True)
+        return
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if path != keep.path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,149 @@
+import io
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+import constants
+from ffmpeg_encoder import ffmpeg_executable
+from instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000  # Whisper resamples to 16 kHz mono anyway
+
+# Lossy formats are already far smaller than 16 kHz FLAC, re-encoding them only costs time
+COMPACT_EXTENSIONS = {".mp3", ".ogg", ".opus", ".aac", ".m4a", ".webm"}
+
+
+def decode_audio(file_name: str, file_bytes: bytes, file_path: Optional[str] = None) -> np.ndarray:
+    """
+    Decode any supported audio format to 16 kHz mono int16 samples with ffmpeg.
+
+    ffmpeg reads `file_path` directly when the audio is already on disk.
+    """
+    def run(source_path):
+        return subprocess.run(
+            [ffmpeg_executable(), "-hide_banner", "-loglevel", "error", "-i", source_path,
+             "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+
+    if file_path:
+        completed = run(file_path)
+    else:
+        # Containers like m4a keep their index at the end, so ffmpeg needs a seekable file rather than a pipe
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file_name)[1]) as source:
+            source.write(file_bytes)
+            source.flush()
+            completed = run(source.name)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Could not decode audio: {completed.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(completed.stdout, dtype=np.int16)
+
+
+def audio_duration(file_name: str, file_bytes: bytes, file_path: Optional[str] = None) -> Optional[float]:
+    """
+    Length of the audio in seconds, read from the container header without decoding the samples.
+
+    :return: The duration, or None if neither soundfile nor ffmpeg can tell
+    """
+    try:
+        info = sf.info(file_path if file_path else io.BytesIO(file_bytes))
+        if info.frames > 0 and info.samplerate > 0:
+            return info.frames / info.samplerate
+    except Exception:
+        pass  # Formats libsndfile does not read, like m4a, fall through to ffmpeg
+
+    def run(source_path):
+        # Without an output ffmpeg only probes the input and prints its header
+        return subprocess.run(
+            [ffmpeg_executable(), "-hide_banner", "-i", source_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+
+    if file_path:
+        completed = run(file_path)
+    else:
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file_name)[1]) as source:
+            source.write(file_bytes)
+            source.flush()
+            completed = run(source.name)
+    match = re.search(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", completed.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def encode_flac(samples: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, SAMPLE_RATE, format="FLAC")
+    return buffer.getvalue()
+
+
+@dataclass
+class CompactAudio:
+    """
+    Audio as it is sent for transcription, with what the pre-encoding saved.
+    """
+    file_name: str
+    data: bytes
+    original_bytes: int
+    seconds: float
+    reencoded: bool
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+
+def compact_audio(
+    file_name: str,
+    file_bytes: bytes,
+    file_path: Optional[str] = None,
+    min_bytes: int = constants.AUDIO_PREPROCESS_MIN_BYTES,
+    samples: Optional[np.ndarray] = None,
+) -> CompactAudio:
+    """
+    Downmix to mono, resample to 16 kHz and re-encode as FLAC before uploading for transcription.
+
+    Lossy formats and files under `min_bytes` are sent unchanged, as is any file the
+    FLAC version would not shrink. Only the upload is affected; the original audio is
+    still what gets muxed into the video.
+
+    :param file_name: Name of the audio file
+    :param file_bytes: Raw audio bytes, or a memory-mapped buffer of them
+    :param file_path: Path of the same audio on disk, decoded in place when given
+    :param min_bytes: Files up to this size are sent unchanged
+    :param samples: The audio already decoded by `decode_audio`, encoded as is instead of decoding it again
+    :return: The audio to upload
+    """
+    start = time.perf_counter()
+    original = CompactAudio(file_name, file_bytes, len(file_bytes), 0.0, False)
+    if os.path.splitext(file_name)[1].lower() in COMPACT_EXTENSIONS or len(file_bytes) <= min_bytes:
+        return original
+
+    with stage("audio_preprocess") as span:
+        if samples is None:
+            samples = decode_audio(file_name, file_bytes, file_path=file_path)
+        flac_bytes = encode_flac(samples)
+        seconds = time.perf_counter() - start
+        span.set(bytes_in=len(file_bytes), bytes_out=len(flac_bytes), bytes_saved=len(file_bytes) - len(flac_bytes))
+
+    if len(flac_bytes) >= len(file_bytes):
+        logger.info(f"{file_name} is already compact, sending it unchanged")
+        return original
+
+    compact = CompactAudio(f"{os.path.splitext(file_name)[0]}.flac", flac_bytes, len(file_bytes), seconds, True)
+    logger.info(
+        f"Pre-encoded {file_name} for transcription: {compact.original_bytes} -> {len(flac_bytes)} bytes "
+        f"({compact.bytes_saved} saved) in {seconds:.2f}s"
+    )
+    return compact
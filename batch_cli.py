@@ -0,0 +1,210 @@
+"""
+Render many audio files to videos without the Streamlit UI.
+
+    python batch_cli.py podcasts/ --output-dir renders --jobs 4 --encode-workers 2
+
+INPUT is a directory of audio files or a manifest: a text file with one audio path
+per line, or a JSON Lines file whose lines are paths or {"audio": path} objects.
+Every job writes its artifacts and a status.json to its own folder under
+--output-dir. Finished stages are reused, so re-running the same command after a
+crash resumes each job where it stopped and skips jobs that are already done.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List
+
+import constants
+
+logger = logging.getLogger("batch_cli")
+
+STATUS_FILE = "status.json"
+
+
+def discover_audio_files(source: str) -> List[str]:
+    if os.path.isdir(source):
+        files = [
+            os.path.join(source, name) for name in sorted(os.listdir(source))
+            if os.path.splitext(name)[1].lstrip(".").lower() in constants.SUPPORTED_FORMATS
+        ]
+        return [os.path.abspath(path) for path in files]
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    files = []
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                line = json.loads(line)["audio"]
+            files.append(os.path.abspath(os.path.join(base_dir, line)))
+    return files
+
+
+def _write_json(path: str, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+class BatchJob:
+    def __init__(self, audio_path: str, output_dir: str):
+        """
+        One audio file and the folder holding its artifacts and status.
+        """
+        self.audio_path = audio_path
+        stem = os.path.splitext(os.path.basename(audio_path))[0]
+        digest = hashlib.sha1(audio_path.encode("utf-8")).hexdigest()[:8]
+        self.job_dir = os.path.join(output_dir, f"{stem}-{digest}")
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.status = self._load(STATUS_FILE) or {"audio": audio_path, "state": "pending", "stage_seconds": {}}
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.job_dir, name)
+
+    def _load(self, name: str):
+        try:
+            with open(self.path(name)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update(self, **fields):
+        self.status.update(fields, updated_at=time.time())
+        _write_json(self.path(STATUS_FILE), self.status)
+
+    def stage(self, name: str, produce):
+        """
+        Return the saved artifact of stage `name`, or run `produce` and save its result.
+        """
+        artifact = f"{name}.json"
+        saved = self._load(artifact)
+        if saved is not None:
+            return saved
+        self.update(state="running", stage=name)
+        start = time.perf_counter()
+        result = produce()
+        _write_json(self.path(artifact), result)
+        self.status["stage_seconds"][name] = round(time.perf_counter() - start, 3)
+        return result
+
+
+def _encode_video(audio_path, image_paths, segments, output_path, backend):
+    # Runs in a worker process
+    from utils import generate_video
+
+    video_path = generate_video(audio_path, image_paths, segments, backend=backend, output_path=output_path)
+    if video_path is None:
+        raise RuntimeError("Video encoding failed, see worker output for details")
+    return video_path
+
+
+def run_job(job: BatchJob, groq_client, api_limit: threading.Semaphore, encode_pool, args):
+    from audio_ingest import ingest_path
+    from chunked_transcription import transcribe_audio_chunked
+    from transcription import transcribe_audio
+    from image_generation_engine import ImageGenerationError
+    from scene_planner import plan_scenes
+    from utils import generate_images, get_image_prompts, get_summarization, segments_to_chunks, successful_image_paths
+
+    if job.status.get("state") == "done" and os.path.exists(job.path("video.mp4")):
+        logger.info(f"Skipping finished job {job.audio_path}")
+        return job.status
+
+    try:
+        def transcribe():
+            audio = ingest_path(job.audio_path)
+            with api_limit, audio.buffer() as file_bytes:
+                if constants.TRANSCRIPTION_MODE == "chunked":
+                    return transcribe_audio_chunked(
+                        groq_client, audio.name, file_bytes, file_path=audio.path, content_hash=audio.sha256
+                    )
+                return transcribe_audio(groq_client, audio.name, file_bytes, content_hash=audio.sha256)
+
+        transcription = job.stage("transcript", transcribe)
+        scenes = plan_scenes(transcription["segments"])
+
+        def summarize():
+            # Falls back to the transcript's leading sentences if the summarizer is down
+            with api_limit:
+                return {"summary": get_summarization(transcription["text"])}
+
+        summary = job.stage("summary", summarize)["summary"]
+
+        def prompts():
+            with api_limit:
+                return get_image_prompts(segments_to_chunks(scenes), summary)
+
+        image_prompts = job.stage("prompts", prompts)["image_prompts"]
+
+        def images():
+            results = list(generate_images(image_prompts, folder_name=job.path("images"), max_concurrency=args.image_concurrency))
+            failed = [str(image_path) for _, image_path in results if isinstance(image_path, ImageGenerationError)]
+            if len(failed) == len(results):
+                raise RuntimeError(f"All images failed: {failed[:3]}")
+            return {"image_paths": successful_image_paths(results), "failed": failed}
+
+        image_paths = job.stage("images", images)["image_paths"]
+
+        def encode():
+            future = encode_pool.submit(
+                _encode_video, job.audio_path, image_paths, scenes, job.path("video.mp4"), args.backend
+            )
+            return {"video_path": future.result()}
+
+        video_path = job.stage("video", encode)["video_path"]
+        job.update(state="done", stage=None, error=None, video_path=video_path)
+        logger.info(f"Finished {job.audio_path} -> {video_path}")
+    except Exception as e:
+        job.update(state="failed", error=str(e), traceback=traceback.format_exc())
+        logger.error(f"Job {job.audio_path} failed during {job.status.get('stage')}: {e}")
+    return job.status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Directory of audio files or a manifest file")
+    parser.add_argument("--output-dir", default="renders", help="Folder receiving one sub-folder per job")
+    parser.add_argument("--jobs", type=int, default=4, help="Jobs worked on at the same time")
+    parser.add_argument("--encode-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Processes encoding videos")
+    parser.add_argument("--api-concurrency", type=int, default=4, help="Transcription, summarization and prompt calls in flight across all jobs")
+    parser.add_argument("--image-concurrency", type=int, default=constants.IMAGE_GENERATION_CONCURRENCY, help="Image requests in flight per job")
+    parser.add_argument("--backend", default=constants.VIDEO_ENCODER_BACKEND, choices=["ffmpeg", "moviepy"])
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    audio_files = discover_audio_files(args.input)
+    if not audio_files:
+        logger.error(f"No audio files found in {args.input}")
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [BatchJob(path, os.path.abspath(args.output_dir)) for path in audio_files]
+
+    from groq import Groq
+
+    groq_client = Groq()
+    api_limit = threading.BoundedSemaphore(args.api_concurrency)
+    # Spawned workers do not inherit the threads and client connections of this process
+    encode_pool = ProcessPoolExecutor(max_workers=args.encode_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    with encode_pool, ThreadPoolExecutor(max_workers=args.jobs, thread_name_prefix="job") as job_pool:
+        statuses = list(job_pool.map(lambda job: run_job(job, groq_client, api_limit, encode_pool, args), jobs))
+
+    done = sum(1 for status in statuses if status.get("state") == "done")
+    logger.info(f"{done} of {len(statuses)} jobs finished, results in {args.output_dir}")
+    return 0 if done == len(statuses) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Offline benchmark of the full pipeline and of generate_video alone.
+
+Every external service is replaced by a local stand-in from benchmarks/fakes.py
+with configurable latency and failure rate, so runs are repeatable and free.
+Results are written as JSON; pass a previous result file to --compare to print
+the change per stage.
+
+    python benchmarks/bench_pipeline.py --durations 30 120 --output bench.json
+    python benchmarks/bench_pipeline.py --durations 30 120 --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeChatGroq, FakeGradioClient, FakeGroqClient, FakeSummarizerServer, Latency, make_audio_fixture  # noqa: E402
+
+
+def _rss_mb(who=resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+class StageRecorder:
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Record wall time, peak Python allocations and process peak RSS of a stage.
+        Extra metrics can be added to the yielded dictionary.
+        """
+        tracemalloc.reset_peak()
+        record = {}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - start, 3)
+            record["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+            record["peak_rss_mb"] = _rss_mb()
+            record["peak_child_rss_mb"] = _rss_mb(resource.RUSAGE_CHILDREN)
+            self.stages[name] = record
+
+
+def install_fakes(args, work_dir, summarizer_url):
+    """
+    Point the pipeline at the local stand-ins. Returns the fake Groq client.
+    """
+    import constants
+    import gradio_client_pool
+    import image_cache
+    import structured_output_extractor
+    import transcription
+
+    constants.SUMMARIZATION_ENDPOINT = summarizer_url
+    FakeChatGroq.latency = Latency(args.llm_latency, args.jitter, args.failure_rate, seed=1)
+    structured_output_extractor.ChatGroq = FakeChatGroq
+    structured_output_extractor._extractors.clear()
+
+    image_latency = Latency(args.image_latency, args.jitter, args.failure_rate, seed=2)
+    connect_latency = Latency(args.connect_latency, 0.0, 0.0, seed=3)
+    gradio_client_pool._image_client_pool = gradio_client_pool.GradioClientPool(
+        "fake-space",
+        factory=lambda: FakeGradioClient(image_latency, connect_latency, output_dir=os.path.join(work_dir, "gradio")),
+    )
+    # A fresh, empty cache per run so every image is really generated
+    image_cache._image_cache = image_cache.ImageCache(directory=os.path.join(work_dir, "image_cache"))
+    transcription._transcription_cache.clear()
+
+    os.makedirs(os.path.join(work_dir, "gradio"), exist_ok=True)
+    return FakeGroqClient(Latency(args.transcription_latency, args.jitter, args.failure_rate, seed=4))
+
+
+def run_full_pipeline(audio_path, groq_client, work_dir, args) -> dict:
+    from chunked_transcription import transcribe_audio_chunked
+    from ffmpeg_encoder import segment_durations, segment_frame_counts
+    from pipeline import RenderPipeline
+    from scene_planner import plan_scenes
+    from utils import get_image_prompts, get_summarization, segments_to_chunks
+
+    recorder = StageRecorder()
+    with open(audio_path, "rb") as f:
+        file_bytes = f.read()
+
+    total_start = time.perf_counter()
+    with recorder.stage("transcription") as record:
+        result = transcribe_audio_chunked(groq_client, os.path.basename(audio_path), file_bytes)
+        record["segments"] = len(result["segments"])
+        record["requests"] = groq_client.audio.transcriptions.calls
+
+    with recorder.stage("scene_planning") as record:
+        segments = plan_scenes(result["segments"])
+        record["scenes"] = len(segments)
+
+    with recorder.stage("summarization"):
+        summary = get_summarization(result["text"])
+
+    with recorder.stage("prompts") as record:
+        prompts = get_image_prompts(segments_to_chunks(segments), summary)["image_prompts"]
+        record["prompts"] = len(prompts)
+
+    with recorder.stage("images_and_encode") as record:
+        pipeline_result = RenderPipeline().run(
+            prompts, segments, audio_path, os.path.join(work_dir, "pipeline.mp4"), folder_name=os.path.join(work_dir, "images")
+        )
+        frames = sum(segment_frame_counts(segment_durations(segments)))
+        record["ok"] = pipeline_result.video_path is not None
+        record["pipeline_seconds"] = pipeline_result.stage_seconds
+        record["segments_per_second"] = round(len(segments) / max(pipeline_result.stage_seconds.get("images", 0), 1e-9), 2)
+        record["frames_per_second"] = round(frames / max(pipeline_result.stage_seconds.get("total", 0), 1e-9), 1)
+
+    total = round(time.perf_counter() - total_start, 3)
+    return {"stages": recorder.stages, "total_seconds": total}, segments, pipeline_result
+
+
+def run_generate_video(audio_path, segments, image_paths, work_dir, backend) -> dict:
+    from ffmpeg_encoder import segment_durations, segment_frame_counts
+    from utils import generate_video
+
+    recorder = StageRecorder()
+    with recorder.stage(f"generate_video_{backend}") as record:
+        with open(audio_path, "rb") as audio_file:
+            video_path = generate_video(audio_file, image_paths, segments, backend=backend, output_path=os.path.join(work_dir, f"{backend}.mp4"))
+        record["ok"] = video_path is not None
+    frames = sum(segment_frame_counts(segment_durations(segments)))
+    record["frames_per_second"] = round(frames / max(record["wall_seconds"], 1e-9), 1)
+    return recorder.stages
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _print_report(results, baseline=None):
+    baseline_runs = {run["audio_seconds"]: run for run in (baseline or {}).get("runs", [])}
+    for run in results["runs"]:
+        print(f"\n=== {run['audio_seconds']}s of audio, {run['segments']} segments, total {run['total_seconds']}s")
+        previous = baseline_runs.get(run["audio_seconds"], {}).get("stages", {})
+        for name, record in run["stages"].items():
+            line = f"  {name:<26}{record['wall_seconds']:>9.3f}s  rss {record['peak_rss_mb']:>7}MB"
+            if "frames_per_second" in record:
+                line += f"  {record['frames_per_second']:>8} frames/s"
+            if name in previous and previous[name]["wall_seconds"]:
+                change = (record["wall_seconds"] - previous[name]["wall_seconds"]) / previous[name]["wall_seconds"] * 100
+                line += f"  ({change:+.1f}% vs baseline)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[30, 120], help="Synthetic audio lengths in seconds")
+    parser.add_argument("--transcription-latency", type=float, default=0.5)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--image-latency", type=float, default=1.0)
+    parser.add_argument("--connect-latency", type=float, default=0.5, help="Time to initialize one Gradio client")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random ± seconds added to every latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability that any fake call fails")
+    parser.add_argument("--backends", nargs="*", default=["ffmpeg"], choices=["ffmpeg", "moviepy"],
+                        help="Backends benchmarked for generate_video alone")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Previous JSON result to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as root, FakeSummarizerServer(
+        Latency(args.llm_latency, args.jitter, args.failure_rate, seed=5)
+    ) as summarizer:
+        for run_index, seconds in enumerate(args.durations):
+            work_dir = os.path.join(root, f"run_{run_index}")
+            os.makedirs(work_dir)
+            audio_path = make_audio_fixture(os.path.join(work_dir, "audio.wav"), seconds, seed=run_index)
+            groq_client = install_fakes(args, work_dir, summarizer.url)
+
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                run, segments, pipeline_result = run_full_pipeline(audio_path, groq_client, work_dir, args)
+                image_paths = [path for _, path in pipeline_result.generated_images if isinstance(path, str)]
+                for backend in args.backends:
+                    run["stages"].update(run_generate_video(audio_path, segments, image_paths, work_dir, backend))
+
+            run.update({"audio_seconds": seconds, "segments": len(segments)})
+            results["runs"].append(run)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Compare encode time and peak memory of the generate_video backends.
+
+Each backend runs in its own subprocess so peak RSS is measured in isolation,
+including the ffmpeg child processes it spawns.
+
+    python benchmarks/bench_video_encoders.py --segments 40 --segment-seconds 3
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKENDS = ["moviepy", "ffmpeg"]
+
+
+def make_fixtures(work_dir, segment_count, segment_seconds, image_count):
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(image_count):
+        # Square images like the Space returns, plus a wide one to exercise cropping
+        size = (1024, 1024) if i % 4 else (1536, 640)
+        pixels = rng.integers(0, 255, size=(size[1], size[0], 3), dtype=np.uint8)
+        path = os.path.join(work_dir, f"image_{i}.png")
+        Image.fromarray(pixels).save(path)
+        images.append(path)
+
+    sample_rate = 44100
+    total_seconds = segment_count * segment_seconds
+    t = np.arange(int(total_seconds * sample_rate)) / sample_rate
+    tone = (0.2 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+    audio_path = os.path.join(work_dir, "audio.wav")
+    with wave.open(audio_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(tone.tobytes())
+
+    segments = [
+        {"start": i * segment_seconds, "end": (i + 1) * segment_seconds - 0.2, "text": f"segment {i}"}
+        for i in range(segment_count)
+    ]
+    return images, audio_path, segments
+
+
+def run_backend(backend, fixtures_path):
+    """Runs inside the child process and prints one JSON line with its measurements."""
+    from utils import generate_video
+
+    with open(fixtures_path) as f:
+        fixtures = json.load(f)
+
+    start = time.perf_counter()
+    with open(fixtures["audio_path"], "rb") as audio_file:
+        video_path = generate_video(audio_file, fixtures["images"], fixtures["segments"], backend=backend)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is reported in kilobytes on Linux
+    own_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({
+        "backend": backend,
+        "ok": video_path is not None,
+        "encode_seconds": round(elapsed, 3),
+        "peak_rss_mb": round(own_rss / 1024, 1),
+        "peak_child_rss_mb": round(children_rss / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=20)
+    parser.add_argument("--segment-seconds", type=float, default=3.0)
+    parser.add_argument("--images", type=int, default=None, help="Unique images, defaults to one per segment")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--run-backend", help=argparse.SUPPRESS)
+    parser.add_argument("--fixtures", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_backend:
+        run_backend(args.run_backend, args.fixtures)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_video_") as work_dir:
+        images, audio_path, segments = make_fixtures(work_dir, args.segments, args.segment_seconds, args.images or args.segments)
+        fixtures_path = os.path.join(work_dir, "fixtures.json")
+        with open(fixtures_path, "w") as f:
+            json.dump({"images": images, "audio_path": audio_path, "segments": segments}, f)
+
+        for backend in args.backends:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-backend", backend, "--fixtures", fixtures_path],
+                stdout=subprocess.PIPE, text=True,
+            )
+            lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+            result = json.loads(lines[-1]) if lines else {"backend": backend, "ok": False}
+            results.append(result)
+
+    print(f"{'backend':<10}{'ok':<6}{'encode s':>10}{'peak RSS MB':>14}{'child RSS MB':>14}")
+    for result in results:
+        print(
+            f"{result['backend']:<10}{str(result['ok']):<6}{result.get('encode_seconds', '-'):>10}"
+            f"{result.get('peak_rss_mb', '-'):>14}{result.get('peak_child_rss_mb', '-'):>14}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"segments": args.segments, "segment_seconds": args.segment_seconds, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
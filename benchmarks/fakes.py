@@ -0,0 +1,251 @@
+"""
+Local stand-ins for the services the pipeline calls, with configurable latency and failures.
+
+- FakeGroqClient replaces the Groq client used for Whisper transcription
+- FakeSummarizerServer is a real HTTP server speaking the summarization endpoint's protocol
+- FakeGradioClient replaces gradio_client.Client for the image generation Space
+- FakeChatGroq replaces ChatGroq inside StructuredOutputExtractor
+"""
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import Future
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import soundfile as sf
+from PIL import Image
+
+
+class FakeServiceError(Exception):
+    pass
+
+
+@dataclass
+class Latency:
+    """
+    Simulated service behaviour: `seconds` ± `jitter` per call, failing with probability `failure_rate`.
+    """
+    seconds: float = 0.0
+    jitter: float = 0.0
+    failure_rate: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def wait(self, name: str):
+        with self._lock:
+            delay = max(0.0, self.seconds + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.failure_rate
+        time.sleep(delay)
+        if fail:
+            raise FakeServiceError(f"Simulated {name} failure")
+
+
+# ---------------------------------------------------------------- fixtures
+
+def make_audio_fixture(path: str, seconds: float, sample_rate: int = 22050, seed: int = 0) -> str:
+    """
+    Write a mono WAV of speech-like noise bursts separated by short pauses, so the
+    chunked transcription has real silence to cut at.
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    elapsed = 0.0
+    while elapsed < seconds:
+        burst = min(rng.uniform(2.0, 6.0), seconds - elapsed)
+        envelope = np.hanning(int(burst * sample_rate))
+        parts.append(rng.standard_normal(len(envelope)) * envelope * 6000)
+        elapsed += burst
+        pause = min(rng.uniform(0.3, 0.8), max(0.0, seconds - elapsed))
+        parts.append(np.zeros(int(pause * sample_rate)))
+        elapsed += pause
+    samples = np.concatenate(parts).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return path
+
+
+# ---------------------------------------------------------------- Groq Whisper
+
+# Consecutive segments take different words from this list, so the scene planner's
+# similarity merging sees separate topics, as it would in a real transcript
+_SEGMENT_WORDS = (
+    "lantern river castle meadow dragon harbor forest comet tower desert "
+    "glacier market violin orchard canyon beacon island temple garden thunder "
+    "lighthouse valley engine palace swamp volcano bridge library mountain ocean"
+).split()
+
+
+def _segment_text(index: int) -> str:
+    words = [_SEGMENT_WORDS[(index * 3 + k) % len(_SEGMENT_WORDS)] for k in range(3)]
+    return f" A {words[0]} by a {words[1]} in {words[2]}."
+
+
+class _Transcription:
+    def __init__(self, text, segments):
+        self.text = text
+        self.segments = segments
+
+
+class _Transcriptions:
+    def __init__(self, latency: Latency, segment_seconds: float):
+        self.latency = latency
+        self.segment_seconds = segment_seconds
+        self.calls = 0
+
+    def create(self, file, **kwargs):
+        self.calls += 1
+        name, data = file
+        if hasattr(data, "read"):
+            data = data.read()
+        info = sf.info(io.BytesIO(data))
+        duration = info.frames / info.samplerate
+        # Latency grows with the amount of audio, like the real service
+        self.latency.wait("transcription")
+        time.sleep(duration * 0.002)
+
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + self.segment_seconds)
+            segments.append({"id": len(segments), "start": start, "end": end, "text": _segment_text(len(segments))})
+            start = end
+        return _Transcription(" ".join(s["text"].strip() for s in segments), segments)
+
+
+class FakeGroqClient:
+    def __init__(self, latency: Latency = None, segment_seconds: float = 3.0):
+        self.audio = type("Audio", (), {})()
+        self.audio.transcriptions = _Transcriptions(latency or Latency(), segment_seconds)
+
+
+# ---------------------------------------------------------------- summarizer endpoint
+
+class FakeSummarizerServer:
+    def __init__(self, latency: Latency = None):
+        """
+        HTTP server answering POST /generate like the summarization Space.
+        """
+        latency = latency or Latency()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                try:
+                    latency.wait("summarization")
+                    text = body.get("text_input", "")
+                    payload, status = {"output": " ".join(text.split()[:40])}, 200
+                except FakeServiceError as e:
+                    payload, status = {"error": str(e)}, 503
+                encoded = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/generate"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ---------------------------------------------------------------- Gradio image Space
+
+class FakeGradioClient:
+    src = "http://127.0.0.1/"
+    headers = {}
+
+    def __init__(self, latency: Latency = None, connect_latency: Latency = None, image_size=(1024, 1024), output_dir=None):
+        """
+        Stand-in for gradio_client.Client; every prediction writes a new image file like the real Space.
+        """
+        (connect_latency or Latency()).wait("connect")
+        self.latency = latency or Latency()
+        self.image_size = image_size
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix="fake_gradio_")
+
+    def predict(self, param_0, api_name=None):
+        self.latency.wait("image generation")
+        seed = abs(hash(param_0)) % (2 ** 32)
+        color = np.random.default_rng(seed).integers(0, 255, size=3, dtype=np.uint8)
+        pixels = np.empty((self.image_size[1], self.image_size[0], 3), dtype=np.uint8)
+        pixels[:] = color
+        fd, path = tempfile.mkstemp(suffix=".webp", dir=self.output_dir)
+        os.close(fd)
+        Image.fromarray(pixels).save(path, format="WEBP")
+        return path
+
+    def submit(self, param_0, api_name=None):
+        job = Future()
+
+        def run():
+            try:
+                job.set_result(self.predict(param_0, api_name=api_name))
+            except Exception as e:
+                job.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return job
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------------- ChatGroq
+
+class _FakeStructuredLLM:
+    def __init__(self, schema, latency: Latency):
+        self.schema = schema
+        self.latency = latency
+
+    def invoke(self, query):
+        self.latency.wait("llm")
+        fields = self.schema.model_fields
+        if "image_prompts" in fields:
+            # Mirror the real prompt: one chunk per "chunk:" line
+            chunks = re.findall(r"^\s*chunk: (.*)$", query, flags=re.MULTILINE)
+            return self.schema(image_prompts=[f"[style: 3D] illustration of {chunk.strip()[:60]}" for chunk in chunks])
+        return self.schema.model_construct()
+
+    async def ainvoke(self, query):
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(None, self.invoke, query)
+
+
+class FakeChatGroq:
+    latency = Latency()
+
+    def __init__(self, model=None, **kwargs):
+        self.model = model
+
+    def with_structured_output(self, schema):
+        return _FakeStructuredLLM(schema, self.latency)
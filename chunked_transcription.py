@@ -0,0 +1,171 @@
+import contextvars
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+import constants
+from audio_preprocessing import SAMPLE_RATE, audio_duration, decode_audio, encode_flac
+from transcription import cache_transcription, get_cached_transcription, transcribe_audio, transcription_params
+
+logger = logging.getLogger(__name__)
+
+SILENCE_FRAME_SECONDS = 0.05
+
+
+@dataclass
+class AudioChunk:
+    """
+    A slice of the audio sent as one transcription request.
+
+    `start`/`end` delimit the audio actually sent (including overlap), while
+    `keep_start`/`keep_end` delimit the part of the timeline this chunk owns.
+    """
+    index: int
+    start: float
+    end: float
+    keep_start: float
+    keep_end: float
+    flac_bytes: bytes
+
+
+def _frame_energy(samples: np.ndarray) -> np.ndarray:
+    frame = int(SAMPLE_RATE * SILENCE_FRAME_SECONDS)
+    usable = len(samples) // frame * frame
+    frames = samples[:usable].astype(np.float32).reshape(-1, frame)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def find_cut_points(samples: np.ndarray, chunk_seconds: float, search_seconds: float) -> List[float]:
+    """
+    Pick chunk boundaries near every `chunk_seconds`, moved back to the quietest
+    moment within `search_seconds` so cuts land in pauses rather than mid-word.
+    """
+    duration = len(samples) / SAMPLE_RATE
+    energy = _frame_energy(samples)
+    cuts = []
+    position = 0.0
+    while duration - position > chunk_seconds:
+        target = position + chunk_seconds
+        first = int(max(position + chunk_seconds / 2, target - search_seconds) / SILENCE_FRAME_SECONDS)
+        last = int(target / SILENCE_FRAME_SECONDS)
+        window = energy[first:last]
+        if len(window):
+            quietest = first + int(np.argmin(window))
+            position = (quietest + 0.5) * SILENCE_FRAME_SECONDS
+        else:
+            position = target
+        cuts.append(position)
+    return cuts
+
+
+def split_audio(samples: np.ndarray, chunk_seconds: float, overlap_seconds: float, search_seconds: float) -> List[AudioChunk]:
+    duration = len(samples) / SAMPLE_RATE
+    boundaries = [0.0] + find_cut_points(samples, chunk_seconds, search_seconds) + [duration]
+
+    chunks = []
+    for index, (keep_start, keep_end) in enumerate(zip(boundaries, boundaries[1:])):
+        # Overlap both sides so words straddling a cut are heard in full by at least one chunk
+        start = max(0.0, keep_start - overlap_seconds)
+        end = min(duration, keep_end + overlap_seconds)
+        flac_bytes = encode_flac(samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)])
+        chunks.append(AudioChunk(index, start, end, keep_start, keep_end, flac_bytes))
+    return chunks
+
+
+def merge_chunk_transcriptions(chunks: List[AudioChunk], transcriptions: List[dict]) -> dict:
+    """
+    Shift every chunk's segments onto the full timeline and drop the duplicates
+    produced by the overlap: a segment belongs to the chunk whose owned range
+    contains its midpoint.
+    """
+    segments = []
+    for chunk, transcription in zip(chunks, transcriptions):
+        for segment in transcription["segments"]:
+            start = segment["start"] + chunk.start
+            end = segment["end"] + chunk.start
+            midpoint = (start + end) / 2
+            is_last = chunk.index == len(chunks) - 1
+            if midpoint < chunk.keep_start or (midpoint >= chunk.keep_end and not is_last):
+                continue
+            merged = dict(segment)
+            merged.update({"id": len(segments), "start": start, "end": end})
+            segments.append(merged)
+
+    text = " ".join(segment["text"].strip() for segment in segments)
+    return {"text": text, "segments": segments}
+
+
+def transcribe_audio_chunked(
+    client,
+    file_name: str,
+    file_bytes: bytes,
+    chunk_seconds: float = constants.TRANSCRIPTION_CHUNK_SECONDS,
+    overlap_seconds: float = constants.TRANSCRIPTION_CHUNK_OVERLAP_SECONDS,
+    search_seconds: float = constants.TRANSCRIPTION_SILENCE_SEARCH_SECONDS,
+    max_concurrency: int = constants.TRANSCRIPTION_CONCURRENCY,
+    file_path: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> dict:
+    """
+    Transcribe long audio as overlapping chunks cut at pauses, sent concurrently.
+
+    Audio shorter than one chunk is sent in a single request. The merged result has
+    the same shape as `transcribe_audio`, with segment timestamps relative to the
+    start of the full file. It is cached under the whole file's content, so a repeat
+    upload is answered before the audio is decoded; chunks are not cached on their own.
+
+    :param client: Groq client
+    :param file_name: Name of the uploaded audio file
+    :param file_bytes: Raw audio bytes, or a memory-mapped buffer of them
+    :param chunk_seconds: Target length of each chunk
+    :param overlap_seconds: Audio repeated on each side of a cut
+    :param search_seconds: How far before the target length to look for a pause
+    :param max_concurrency: Chunks transcribed at the same time
+    :param file_path: Path of the same audio on disk, decoded in place instead of through a temporary copy
+    :param content_hash: SHA-256 of `file_bytes` if already known
+    :return: Dictionary with the full `text` and the timestamped `segments`
+    """
+    params = transcription_params()
+    content_hash = content_hash or hashlib.sha256(file_bytes).hexdigest()
+    cached = get_cached_transcription(content_hash, params)
+    if cached is not None:
+        return cached
+
+    # Short audio is sent whole, and compact_audio decodes it only if it is worth re-encoding
+    duration = audio_duration(file_name, file_bytes, file_path=file_path)
+    if duration is not None and duration <= chunk_seconds:
+        transcription = transcribe_audio(client, file_name, file_bytes, file_path=file_path, use_cache=False)
+        cache_transcription(content_hash, params, transcription)
+        return transcription
+
+    samples = decode_audio(file_name, file_bytes, file_path=file_path)
+    if len(samples) / SAMPLE_RATE <= chunk_seconds:
+        # The header gave no duration; preprocessing encodes these samples instead of decoding again
+        transcription = transcribe_audio(
+            client, file_name, file_bytes, file_path=file_path, samples=samples, use_cache=False
+        )
+        cache_transcription(content_hash, params, transcription)
+        return transcription
+
+    chunks = split_audio(samples, chunk_seconds, overlap_seconds, search_seconds)
+    logger.info(f"Transcribing {len(chunks)} chunks with up to {max_concurrency} in parallel.")
+
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="transcribe") as executor:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run, transcribe_audio, client, f"{stem}_{chunk.index}.flac", chunk.flac_bytes,
+                preprocess=False, use_cache=False,
+            )
+            for chunk in chunks
+        ]
+        transcriptions = [future.result() for future in futures]
+
+    transcription = merge_chunk_transcriptions(chunks, transcriptions)
+    cache_transcription(content_hash, params, transcription)
+    return transcription
@@ -11,4 +11,103 @@ IMAGE_GENERATION_SPACE_NAME="habib926653/stabilityai-stable-diffusion-3.5-large-
 # Supported formats
 SUPPORTED_FORMATS = ["mp3", "wav", "ogg", "flac", "aac", "m4a"]
 
+# Image generation engine
+IMAGE_GENERATION_CONCURRENCY = int(os.getenv("IMAGE_GENERATION_CONCURRENCY", 4))  # requests kept in flight
+IMAGE_GENERATION_TIMEOUT = float(os.getenv("IMAGE_GENERATION_TIMEOUT", 120))  # seconds per attempt
+IMAGE_GENERATION_MAX_RETRIES = int(os.getenv("IMAGE_GENERATION_MAX_RETRIES", 2))
+IMAGE_GENERATION_RETRY_BACKOFF = float(os.getenv("IMAGE_GENERATION_RETRY_BACKOFF", 2.0))  # base delay in seconds
 
+# Gradio client pool shared by all sessions for the image generation Space
+IMAGE_CLIENT_POOL_SIZE = int(os.getenv("IMAGE_CLIENT_POOL_SIZE", 8))
+IMAGE_CLIENT_HEALTH_CHECK_INTERVAL = float(os.getenv("IMAGE_CLIENT_HEALTH_CHECK_INTERVAL", 300))  # idle seconds before re-checking a client
+
+# On-disk cache of generated images, keyed by prompt and Space name
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(os.getcwd(), "tmp_dir", "image_cache"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Transcription
+TRANSCRIPTION_MODEL = "whisper-large-v3-turbo"
+TRANSCRIPTION_PROMPT = "Take Note of Overall Context of the Audio"
+TRANSCRIPTION_CACHE_SIZE = int(os.getenv("TRANSCRIPTION_CACHE_SIZE", 64))  # cached transcripts kept in memory
+TRANSCRIPTION_CACHE_TTL = float(os.getenv("TRANSCRIPTION_CACHE_TTL", 6 * 60 * 60))  # seconds
+
+# Video encoding backend for generate_video: "ffmpeg" (direct still-image encode) or "moviepy"
+VIDEO_ENCODER_BACKEND = os.getenv("VIDEO_ENCODER_BACKEND", "ffmpeg")
+
+# Extra output sizes encoded alongside the 1280x720 video: comma-separated names from ffmpeg_encoder.RENDITIONS
+# such as "vertical,480p", empty for none
+VIDEO_RENDITIONS = os.getenv("VIDEO_RENDITIONS", "")
+
+# Progressive HLS output: scenes are playable as they are encoded, from Streamlit's static folder
+STREAM_OUTPUT = os.getenv("STREAM_OUTPUT", "1") == "1"
+STREAM_DIR = os.getenv("STREAM_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "streams"))  # next to app.py
+STREAM_URL_PREFIX = os.getenv("STREAM_URL_PREFIX", "app/static/streams")  # where Streamlit serves STREAM_DIR
+STREAM_MIN_SEGMENTS = int(os.getenv("STREAM_MIN_SEGMENTS", 2))  # scenes encoded before the player is shown
+# hls.js plays the preview in browsers without native HLS. A copy at HLS_JS_LOCAL_PATH is served by the
+# app itself; otherwise the pinned release is loaded, checked against HLS_JS_INTEGRITY ("sha384-...") when set
+HLS_JS_LOCAL_PATH = os.getenv("HLS_JS_LOCAL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "hls.min.js"))
+HLS_JS_LOCAL_URL = os.getenv("HLS_JS_LOCAL_URL", "app/static/hls.min.js")  # where Streamlit serves HLS_JS_LOCAL_PATH
+HLS_JS_URL = os.getenv("HLS_JS_URL", "https://cdn.jsdelivr.net/npm/hls.js@1.5.17/dist/hls.min.js")
+HLS_JS_INTEGRITY = os.getenv("HLS_JS_INTEGRITY", "")
+
+# Encoded segments kept per session, keyed by content, so editing one scene re-encodes only that scene
+SCENE_ARTIFACT_DIR = os.getenv("SCENE_ARTIFACT_DIR", os.path.join(os.getcwd(), "tmp_dir", "scenes"))
+
+# Chunked transcription for long audio: "chunked" splits at pauses and transcribes chunks in parallel, "single" sends one request
+TRANSCRIPTION_MODE = os.getenv("TRANSCRIPTION_MODE", "chunked")
+TRANSCRIPTION_CHUNK_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", 120))
+TRANSCRIPTION_CHUNK_OVERLAP_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_OVERLAP_SECONDS", 1.0))
+TRANSCRIPTION_SILENCE_SEARCH_SECONDS = float(os.getenv("TRANSCRIPTION_SILENCE_SEARCH_SECONDS", 15))
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", 4))
+
+# Pipelined rendering: segments encoded in parallel while images are still being generated
+PIPELINE_ENCODE_WORKERS = int(os.getenv("PIPELINE_ENCODE_WORKERS", 2))
+
+# Instrumentation: per-stage JSON logs plus Prometheus-style metrics
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "1") == "1"
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(os.getcwd(), "tmp_dir", "metrics.prom"))  # empty to disable
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", 15))  # seconds between rewrites of METRICS_FILE
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # serve /metrics on this port when set
+
+# Structured output extraction
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", 4))
+
+# Image prompt generation: "windowed" queries the LLM for windows of chunks in parallel, "single" sends one query
+PROMPT_GENERATION_MODE = os.getenv("PROMPT_GENERATION_MODE", "windowed")
+PROMPT_WINDOW_SIZE = int(os.getenv("PROMPT_WINDOW_SIZE", 8))  # chunks per query
+PROMPT_WINDOW_CONTEXT_CHARS = int(os.getenv("PROMPT_WINDOW_CONTEXT_CHARS", 400))  # preceding transcript sent with each window
+PROMPT_WINDOW_MAX_RETRIES = int(os.getenv("PROMPT_WINDOW_MAX_RETRIES", 2))
+
+# Scene planning: adjacent segments are merged into scenes, one image per scene
+SCENE_TARGET_SECONDS = float(os.getenv("SCENE_TARGET_SECONDS", 8))  # 0 keeps one image per segment
+SCENE_MAX_IMAGES = int(os.getenv("SCENE_MAX_IMAGES", 60))  # 0 for no cap
+SCENE_SIMILARITY_THRESHOLD = float(os.getenv("SCENE_SIMILARITY_THRESHOLD", 0.3))  # 0 disables text-based merging
+
+# Pooled HTTP clients for JSON endpoints such as the summarizer
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))  # keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 30))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 2))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 1.0))
+HTTP_BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", 5))  # consecutive failed requests before the circuit opens
+HTTP_BREAKER_RESET_SECONDS = float(os.getenv("HTTP_BREAKER_RESET_SECONDS", 60))
+
+# Summarization
+SUMMARIZATION_READ_TIMEOUT = float(os.getenv("SUMMARIZATION_READ_TIMEOUT", 60))
+SUMMARY_FALLBACK_SENTENCES = int(os.getenv("SUMMARY_FALLBACK_SENTENCES", 3))  # leading transcript sentences used when the summarizer fails
+
+# Uploaded audio is written here once per session, named by its content hash
+AUDIO_INGEST_DIR = os.getenv("AUDIO_INGEST_DIR", os.path.join(os.getcwd(), "tmp_dir", "audio"))
+
+# Background render jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))  # jobs running at once
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", 16))  # jobs waiting for a worker before new ones are refused
+JOB_ENCODE_SLOTS = int(os.getenv("JOB_ENCODE_SLOTS", max(1, (os.cpu_count() or 2) // 2)))  # encodes running at once across all jobs
+JOB_DIR = os.getenv("JOB_DIR", os.path.join(os.getcwd(), "tmp_dir", "jobs"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))  # how often the UI refreshes a running job
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", 24))  # finished jobs and idle session files are deleted after this, 0 keeps them
+JOB_KEEP_PER_SESSION = int(os.getenv("JOB_KEEP_PER_SESSION", 5))  # newest finished jobs kept per session, 0 for no cap
+
+# Audio sent for transcription is downmixed to 16 kHz mono FLAC when that makes it smaller
+TRANSCRIPTION_PREPROCESS = os.getenv("TRANSCRIPTION_PREPROCESS", "1") == "1"
+AUDIO_PREPROCESS_MIN_BYTES = int(os.getenv("AUDIO_PREPROCESS_MIN_BYTES", 256 * 1024))  # smaller files are sent as they are
@@ -0,0 +1,327 @@
+import logging
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import imageio_ffmpeg
+import numpy as np
+from PIL import Image
+
+from frame_preparation import PreparedFrames
+
+logger = logging.getLogger(__name__)
+
+FPS = 30
+
+# Shared by every segment so join_segments can concatenate them without re-encoding
+SEGMENT_VIDEO_ARGS = [
+    "-c:v", "libx264", "-tune", "stillimage", "-preset", "veryfast",
+    "-profile:v", "high", "-pix_fmt", "yuv420p", "-video_track_timescale", "15360",
+]
+
+# Renditions are derived copies, so they get x264's cheapest preset; x264 is nearly all of
+# the cost of an extra output, so this is where adding renditions is made cheaper
+RENDITION_PRESET = "ultrafast"
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """
+    An extra output size encoded from the same prepared frames as the main video.
+
+    The centre of each frame is cropped to `crop_aspect` (width / height, None keeps
+    the whole frame), scaled to fit `width`x`height` and padded with black.
+    """
+    name: str
+    width: int
+    height: int
+    video_bitrate: Optional[str] = None  # peak bitrate such as "800k", None for no cap
+    crop_aspect: Optional[float] = None
+
+    def video_filter(self) -> str:
+        steps = []
+        if self.crop_aspect:
+            steps.append(f"crop='min(iw,ih*{self.crop_aspect})':'min(ih,iw/{self.crop_aspect})'")
+        steps += [
+            f"scale={self.width}:{self.height}:force_original_aspect_ratio=decrease",
+            f"pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2",
+            "setsar=1",
+            "format=yuv420p",
+        ]
+        return ",".join(steps)
+
+    def bitrate_args(self) -> List[str]:
+        if not self.video_bitrate:
+            return []
+        # A cap rather than a target: stills need far less than any fixed bitrate, so x264 keeps its
+        # constant quality and only the busiest frames are held down
+        bitrate = int(self.video_bitrate.rstrip("k"))
+        return ["-crf", "23", "-maxrate", self.video_bitrate, "-bufsize", f"{2 * bitrate}k"]
+
+
+# The images are square, so the vertical cut keeps the whole image and pads above and below it
+RENDITIONS: Dict[str, Rendition] = {
+    "vertical": Rendition("vertical", 720, 1280, video_bitrate="2500k", crop_aspect=1.0),
+    "480p": Rendition("480p", 854, 480, video_bitrate="800k"),
+}
+
+
+def parse_renditions(names: str) -> List[Rendition]:
+    """
+    Look up a comma-separated list of rendition names, such as "vertical,480p".
+
+    :raises ValueError: If a name is not in `RENDITIONS`
+    """
+    renditions = []
+    for name in filter(None, (name.strip() for name in names.split(","))):
+        if name not in RENDITIONS:
+            raise ValueError(f"Unknown rendition {name!r}, expected one of {', '.join(RENDITIONS)}")
+        renditions.append(RENDITIONS[name])
+    return renditions
+
+
+def rendition_path(output_path: str, name: str) -> str:
+    """
+    Where the `name` rendition of `output_path` is written: video.mp4 -> video_vertical.mp4.
+    """
+    stem, extension = os.path.splitext(output_path)
+    return f"{stem}_{name}{extension}"
+
+
+def _split_filter(source: str, renditions: Sequence[Rendition], main_filter: str, timing_filter: str) -> str:
+    # Decode once, then fan out: one branch for the main output and one per rendition. Each
+    # branch is scaled and converted to yuv420p before `timing_filter` repeats its frames,
+    # so that work is done once per still rather than once per output frame.
+    labels = [f"[out{i}]" for i in range(len(renditions) + 1)]
+    branches = [f"[branch{i}]" for i in range(len(renditions) + 1)]
+    graph = [
+        f"{source}split={len(branches)}{''.join(branches)}",
+        f"{branches[0]}{main_filter},{timing_filter}{labels[0]}",
+    ]
+    for branch, label, rendition in zip(branches[1:], labels[1:], renditions):
+        graph.append(f"{branch}{rendition.video_filter()},{timing_filter}{label}")
+    return ";".join(graph)
+
+
+def _rendition_video_args(video_args: Sequence[str]) -> List[str]:
+    args = list(video_args)
+    args[args.index("-preset") + 1] = RENDITION_PRESET
+    return args
+
+
+def ffmpeg_executable() -> str:
+    """
+    Path of the ffmpeg binary bundled with imageio-ffmpeg.
+    """
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def segment_durations(segments) -> List[float]:
+    """
+    Display time of every segment: each one lasts until the next segment starts,
+    the last one until its own end, so gaps between segments are covered.
+    """
+    durations = []
+    for i, segment in enumerate(segments):
+        end_time = segments[i + 1]["start"] if i < len(segments) - 1 else segment["end"]
+        durations.append(end_time - segment["start"])
+    return durations
+
+
+def _write_stills(prepared: PreparedFrames, directory: str) -> List[str]:
+    # ffmpeg rebuilds its filter graph (and drops frames) whenever the input size
+    # changes mid-stream, so it is fed the prepared same-size frames, one file per
+    # distinct image.
+    still_paths = []
+    for index, frame in enumerate(prepared.frames):
+        still_path = os.path.join(directory, f"still_{index}.png")
+        Image.fromarray(frame).save(still_path, compress_level=1)
+        still_paths.append(still_path)
+    return [still_paths[index] for index in prepared.frame_indices]
+
+
+def _write_concat_list(entries: Sequence[Tuple[str, float]], directory: str) -> str:
+    list_path = os.path.join(directory, "slideshow.ffconcat")
+    with open(list_path, "w") as f:
+        f.write("ffconcat version 1.0\n")
+        for image_path, duration in entries:
+            escaped = os.path.abspath(image_path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\nduration {duration:.6f}\n")
+        # The concat demuxer ignores the duration of the final entry unless the file is repeated
+        escaped = os.path.abspath(entries[-1][0]).replace("'", "'\\''")
+        f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+def _hold_last_frame(last_duration: float) -> str:
+    # Concat timestamps are quantized to the image demuxer's 1/25s time base and the
+    # stream ends on the last image's start, so hold the final frame long enough for
+    # `-t` to cut the output at the exact total duration.
+    return f"tpad=stop_mode=clone:stop_duration={last_duration + 1:.6f}"
+
+
+def run_ffmpeg(args: List[str], input_bytes: Optional[bytes] = None):
+    command = [ffmpeg_executable(), "-hide_banner", "-loglevel", "error", "-y"] + args
+    logger.debug(f"Running: {' '.join(command)}")
+    completed = subprocess.run(command, input=input_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({completed.returncode}): {completed.stderr.decode(errors='replace').strip()}")
+
+
+def encode_slideshow(
+    prepared: PreparedFrames,
+    durations: Sequence[float],
+    audio_path: str,
+    output_path: str,
+    fps: int = FPS,
+    renditions: Sequence[Rendition] = (),
+) -> str:
+    """
+    Encode a slideshow of still images straight with ffmpeg.
+
+    Every distinct prepared frame is written once, held for its duration by the
+    concat demuxer and duplicated to the output frame rate inside ffmpeg, so no
+    per-frame work happens in Python.
+
+    :param prepared: Letterboxed frames with one entry per segment
+    :param durations: Display time in seconds of each segment
+    :param audio_path: Audio muxed into the output
+    :param output_path: Where the MP4 is written
+    :param renditions: Extra sizes encoded in the same ffmpeg run, written to `rendition_path(output_path, name)`
+    :return: `output_path`
+    """
+    if len(prepared.frame_indices) != len(durations) or not durations:
+        raise ValueError("encode_slideshow needs one duration per segment and at least one segment")
+
+    total_duration = sum(durations)
+    output_args = [
+        "-c:v", "libx264", "-tune", "stillimage", "-preset", "veryfast",
+        "-c:a", "aac",
+        "-t", f"{total_duration:.6f}",
+        "-movflags", "+faststart",
+    ]
+    with tempfile.TemporaryDirectory(prefix="slideshow_") as work_dir:
+        stills = _write_stills(prepared, work_dir)
+        list_path = _write_concat_list(list(zip(stills, durations)), work_dir)
+        timing = f"fps={fps},{_hold_last_frame(durations[-1])}"
+        if not renditions:
+            run_ffmpeg([
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-i", audio_path,
+                "-map", "0:v:0", "-map", "1:a:0",
+                "-vf", f"format=yuv420p,{timing}",
+                *output_args,
+                output_path,
+            ])
+            return output_path
+
+        args = [
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", audio_path,
+            "-filter_complex", _split_filter("[0:v]", renditions, "format=yuv420p", timing),
+            "-map", "[out0]", "-map", "1:a:0", *output_args, output_path,
+        ]
+        for index, rendition in enumerate(renditions, start=1):
+            args += [
+                "-map", f"[out{index}]", "-map", "1:a:0", *_rendition_video_args(output_args), *rendition.bitrate_args(),
+                rendition_path(output_path, rendition.name),
+            ]
+        run_ffmpeg(args)
+    return output_path
+
+
+def segment_frame_counts(durations: Sequence[float], fps: int = FPS) -> List[int]:
+    """
+    Frames per segment, with boundaries rounded on the shared frame grid so the
+    rounding error never accumulates across segments.
+    """
+    counts = []
+    elapsed = 0.0
+    previous_boundary = 0
+    for duration in durations:
+        elapsed += duration
+        boundary = round(elapsed * fps)
+        counts.append(boundary - previous_boundary)
+        previous_boundary = boundary
+    return counts
+
+
+def encode_segment(
+    frame: np.ndarray,
+    frame_count: int,
+    output_path: str,
+    fps: int = FPS,
+    renditions: Sequence[Rendition] = (),
+) -> str:
+    """
+    Encode one prepared frame as a video-only segment of exactly `frame_count` frames.
+
+    The frame is piped in once and repeated by ffmpeg's loop filter, so the still is
+    neither re-read nor re-decoded for every output frame. Each of `renditions` is
+    split off the same stream and written to `rendition_path(output_path, name)`.
+    """
+    if frame_count < 1:
+        raise ValueError("A segment needs at least one frame")
+    height, width = frame.shape[:2]
+    loop = f"loop=loop={frame_count - 1}:size=1:start=0"
+    args = ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-framerate", str(fps), "-i", "pipe:0"]
+    if not renditions:
+        args += ["-vf", f"format=yuv420p,{loop}", "-frames:v", str(frame_count), *SEGMENT_VIDEO_ARGS, output_path]
+    else:
+        args += [
+            "-filter_complex", _split_filter("[0:v]", renditions, "format=yuv420p", loop),
+            "-map", "[out0]", "-frames:v", str(frame_count), *SEGMENT_VIDEO_ARGS, output_path,
+        ]
+        for index, rendition in enumerate(renditions, start=1):
+            args += [
+                "-map", f"[out{index}]", "-frames:v", str(frame_count), *_rendition_video_args(SEGMENT_VIDEO_ARGS),
+                *rendition.bitrate_args(),
+                rendition_path(output_path, rendition.name),
+            ]
+    run_ffmpeg(args, input_bytes=np.ascontiguousarray(frame).tobytes())
+    return output_path
+
+
+def encode_hls_fragment(segment_path: str, audio_path: str, start: float, duration: float, output_path: str) -> str:
+    """
+    Wrap an encoded segment and its slice of the audio as an MPEG-TS fragment for HLS.
+
+    The video is copied, only the audio slice is encoded. Timestamps are offset to
+    `start`, so consecutive fragments play as one continuous stream.
+    """
+    run_ffmpeg([
+        "-i", segment_path,
+        "-ss", f"{start:.6f}", "-t", f"{duration:.6f}", "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy", "-c:a", "aac",
+        "-output_ts_offset", f"{start:.6f}", "-avoid_negative_ts", "disabled",
+        "-f", "mpegts", output_path,
+    ])
+    return output_path
+
+
+def join_segments(segment_paths: Sequence[str], audio_path: str, output_path: str, total_duration: float) -> str:
+    """
+    Concatenate encoded segments without re-encoding the video and mux in the audio.
+    """
+    if not segment_paths:
+        raise ValueError("join_segments needs at least one segment")
+    with tempfile.TemporaryDirectory(prefix="join_") as work_dir:
+        list_path = os.path.join(work_dir, "segments.ffconcat")
+        with open(list_path, "w") as f:
+            f.write("ffconcat version 1.0\n")
+            for segment_path in segment_paths:
+                escaped = os.path.abspath(segment_path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        run_ffmpeg([
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c:v", "copy", "-c:a", "aac",
+            "-t", f"{total_duration:.6f}",
+            "-movflags", "+faststart",
+            output_path,
+        ])
+    return output_path
@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+from PIL import Image
+
+from scene_artifacts import file_sha256
+
+FRAME_WIDTH = 1280
+FRAME_HEIGHT = 720
+
+
+@dataclass
+class PreparedFrames:
+    """
+    Letterboxed frames for a slideshow, stored once per distinct image.
+
+    `frames` holds one read-only uint8 array of shape (height, width, 3) per distinct
+    source image; `frame_indices` maps every segment to its frame, so segments that
+    show the same image share the same buffer.
+    """
+    frames: List[np.ndarray]
+    frame_indices: List[int]
+    width: int
+    height: int
+
+    def frame_for(self, segment_index: int) -> np.ndarray:
+        return self.frames[self.frame_indices[segment_index]]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(frame.nbytes for frame in self.frames)
+
+
+def letterbox(image: Image.Image, width: int = FRAME_WIDTH, height: int = FRAME_HEIGHT) -> np.ndarray:
+    """
+    Match MoviePy's `resize(height=...).on_color(size=..., pos="center")`: scale to the
+    frame height, centre-crop anything wider than the frame and pad the rest with black.
+    """
+    image = image.convert("RGB")
+    scaled_width = max(1, round(image.width * height / image.height))
+    pixels = np.asarray(image.resize((scaled_width, height), Image.LANCZOS), dtype=np.uint8)
+
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    if scaled_width >= width:
+        left = (scaled_width - width) // 2
+        canvas[:, :] = pixels[:, left:left + width]
+    else:
+        left = (width - scaled_width) // 2
+        canvas[:, left:left + scaled_width] = pixels
+    canvas.flags.writeable = False
+    return canvas
+
+
+def prepare_frames(image_paths: Sequence[str], width: int = FRAME_WIDTH, height: int = FRAME_HEIGHT) -> PreparedFrames:
+    """
+    Decode and letterbox every distinct image once.
+
+    :param image_paths: Image shown by each segment, repeats allowed
+    :param width: Output frame width
+    :param height: Output frame height
+    :return: PreparedFrames shared by all segments
+    """
+    frames = []
+    frame_indices = []
+    seen = {}
+    hashes = {}
+    for image_path in image_paths:
+        # Cache hits are copies at their own paths, so the same picture is only recognised by its content;
+        # a path repeated across segments is hashed once
+        if image_path not in hashes:
+            hashes[image_path] = file_sha256(image_path)
+        key = hashes[image_path]
+        if key not in seen:
+            with Image.open(image_path) as image:
+                frames.append(letterbox(image, width, height))
+            seen[key] = len(frames) - 1
+        frame_indices.append(seen[key])
+    return PreparedFrames(frames=frames, frame_indices=frame_indices, width=width, height=height)
@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+import urllib.parse
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import httpx
+from gradio_client import Client
+
+import constants
+from instrumentation import record_api_call
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledClient:
+    def __init__(self, client: Client):
+        self.client = client
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class GradioClientPool:
+    def __init__(
+        self,
+        src: str,
+        hf_token: Optional[str] = None,
+        max_size: int = constants.IMAGE_CLIENT_POOL_SIZE,
+        health_check_interval: float = constants.IMAGE_CLIENT_HEALTH_CHECK_INTERVAL,
+        factory: Optional[Callable[[], Client]] = None,
+    ):
+        """
+        Process-wide pool of initialized Gradio clients for a single Space.
+
+        Creating a `Client` fetches the Space state, config and API info, so clients
+        are kept and handed out again instead of being rebuilt for every request.
+
+        :param src: Space name or URL the clients connect to
+        :param hf_token: Hugging Face token used when connecting
+        :param max_size: Maximum number of clients alive (idle or checked out) at once
+        :param health_check_interval: Idle seconds after which a client is checked before reuse
+        :param factory: Optional callable creating a new client, defaults to `Client(src, hf_token=...)`
+        """
+        self.src = src
+        self.hf_token = hf_token
+        self.max_size = max(1, int(max_size))
+        self.health_check_interval = health_check_interval
+        self._factory = factory or (lambda: Client(self.src, hf_token=self.hf_token))
+
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.connect_seconds = 0.0
+        self.discarded = 0
+        self.failed_health_checks = 0
+
+    def _connect(self) -> _PooledClient:
+        start = time.perf_counter()
+        ok = False
+        try:
+            client = self._factory()
+            ok = True
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.misses += 1
+                self.connect_seconds += elapsed
+            record_api_call("image_space_connect", elapsed, ok=ok)
+        logger.info(f"Connected new Gradio client to {self.src} in {elapsed:.2f}s")
+        return _PooledClient(client)
+
+    def _is_healthy(self, pooled: _PooledClient) -> bool:
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+        try:
+            config_url = urllib.parse.urljoin(pooled.client.src, "config")
+            response = httpx.get(config_url, headers=pooled.client.headers, timeout=5)
+            return response.status_code < 500
+        except Exception as e:
+            logger.warning(f"Gradio client health check failed: {e}")
+            return False
+
+    def _discard(self, pooled: _PooledClient):
+        with self._lock:
+            self.discarded += 1
+        try:
+            pooled.client.close()
+        except Exception:
+            pass
+
+    def _acquire(self) -> _PooledClient:
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    pooled = self._idle.popleft() if self._idle else None
+                if pooled is None:
+                    return self._connect()
+                if self._is_healthy(pooled):
+                    with self._lock:
+                        self.hits += 1
+                    return pooled
+                with self._lock:
+                    self.failed_health_checks += 1
+                self._discard(pooled)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, pooled: _PooledClient, healthy: bool):
+        try:
+            if healthy:
+                pooled.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(pooled)
+            else:
+                self._discard(pooled)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def client(self):
+        """
+        Check a client out of the pool for the duration of the `with` block.
+
+        Blocks while `max_size` clients are in use. If the block raises, the client is
+        closed instead of being returned, so the next caller reconnects.
+        """
+        pooled = self._acquire()
+        healthy = False
+        try:
+            yield pooled.client
+            healthy = True
+        finally:
+            self._release(pooled, healthy)
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "connect_seconds": round(self.connect_seconds, 3),
+                "discarded": self.discarded,
+                "failed_health_checks": self.failed_health_checks,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+            }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            try:
+                pooled.client.close()
+            except Exception:
+                pass
+
+
+_image_client_pool = None
+_image_client_pool_lock = threading.Lock()
+
+
+def get_image_client_pool() -> GradioClientPool:
+    """
+    Return the pool of clients for the image generation Space, shared by every session in the process.
+    """
+    global _image_client_pool
+    with _image_client_pool_lock:
+        if _image_client_pool is None:
+            _image_client_pool = GradioClientPool(constants.IMAGE_GENERATION_SPACE_NAME, hf_token=constants.HF_TOKEN)
+        return _image_client_pool
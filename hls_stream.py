@@ -0,0 +1,186 @@
+"""
+Progressive HLS output, so a render can be watched while it is still encoding.
+
+    stream = HLSStream(session_stream_dir(session_id, job_id), durations, audio_path)
+    stream.add_segment(index, segment_path)  # from any thread, in any order
+    stream.finish()
+
+Every encoded segment is wrapped, with its slice of the audio, as an MPEG-TS
+fragment and appended to an EVENT playlist as soon as all segments before it
+are in. The folder lives under Streamlit's static folder, so the playlist is
+served by the app itself and played with hls.js while later scenes encode.
+"""
+import html
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+from typing import Callable, List, Optional, Sequence
+
+import constants
+from ffmpeg_encoder import encode_hls_fragment
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = "stream.m3u8"
+
+
+def session_stream_dir(session_id: str, job_id: str) -> str:
+    return os.path.join(constants.STREAM_DIR, session_id, job_id)
+
+
+def stream_url(playlist_path: str) -> str:
+    """
+    URL the app serves `playlist_path` at, relative to the app's root.
+    """
+    relative = os.path.relpath(playlist_path, constants.STREAM_DIR).replace(os.sep, "/")
+    return f"{constants.STREAM_URL_PREFIX.rstrip('/')}/{relative}"
+
+
+def release_session_streams(session_id: str):
+    """
+    Delete every stream written for the session.
+    """
+    shutil.rmtree(os.path.join(constants.STREAM_DIR, session_id), ignore_errors=True)
+
+
+class HLSStream:
+    def __init__(
+        self,
+        directory: str,
+        durations: Sequence[float],
+        audio_path: str,
+        on_publish: Optional[Callable[[str, int, int], None]] = None,
+    ):
+        """
+        HLS event playlist that grows as segments are encoded.
+
+        :param directory: Folder for the playlist and its fragments
+        :param durations: Exact duration of every segment in seconds, 0 for segments that are not encoded
+        :param audio_path: Audio the fragments are cut from
+        :param on_publish: Called with (playlist path, segments published, segments in total)
+            whenever the playlist grows
+        """
+        self.directory = directory
+        self.durations = list(durations)
+        self.starts = [sum(self.durations[:i]) for i in range(len(self.durations))]
+        self.audio_path = audio_path
+        self.on_publish = on_publish
+        self.playlist_path = os.path.join(directory, PLAYLIST_NAME)
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Segments without frames are never encoded, so they count as published right away
+        self._fragments = {i: None for i, duration in enumerate(self.durations) if duration <= 0}
+        self._published = 0
+        self._finished = False
+        self._write_playlist()
+
+    @property
+    def published(self) -> int:
+        with self._lock:
+            return self._published
+
+    def _fragment_entries(self) -> List[str]:
+        entries = []
+        gap = False
+        for index in range(self._published):
+            fragment = self._fragments[index]
+            if fragment is None:
+                # A segment that failed to wrap leaves a hole in the timestamps the player has to jump
+                gap = gap or self.durations[index] > 0
+                continue
+            if gap and entries:
+                entries.append("#EXT-X-DISCONTINUITY")
+            entries += [f"#EXTINF:{self.durations[index]:.6f},", fragment]
+            gap = False
+        return entries
+
+    def _write_playlist(self):
+        # Every fragment's rounded duration must fit the target duration, and the
+        # target may not change while the playlist grows, so it is set from all segments
+        target = max(1, math.ceil(max(self.durations, default=1)))
+        lines = [
+            "#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target}", "#EXT-X-MEDIA-SEQUENCE:0",
+            *self._fragment_entries(),
+        ]
+        if self._finished:
+            lines.append("#EXT-X-ENDLIST")
+        tmp_path = f"{self.playlist_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.playlist_path)
+
+    def add_segment(self, index: int, segment_path: str) -> int:
+        """
+        Turn an encoded segment into a fragment and publish every fragment now in order.
+
+        A segment that cannot be wrapped is skipped, like segments without frames, so the
+        ones after it are still published; the error is raised once they are.
+
+        :return: Number of segments published
+        """
+        fragment = f"fragment_{index:05d}.ts"
+        fragment_path = os.path.join(self.directory, fragment)
+        error = None
+        try:
+            encode_hls_fragment(segment_path, self.audio_path, self.starts[index], self.durations[index], fragment_path)
+        except Exception as e:
+            error = e
+            fragment = None
+            if os.path.exists(fragment_path):
+                os.remove(fragment_path)
+        with self._lock:
+            self._fragments[index] = fragment
+            before = self._published
+            while self._published in self._fragments:
+                self._published += 1
+            published, total = self._published, len(self.durations)
+            if published > before:
+                self._write_playlist()
+        if published > before and self.on_publish:
+            self.on_publish(self.playlist_path, published, total)
+        if error is not None:
+            raise error
+        return published
+
+    def finish(self):
+        """
+        Mark the playlist complete, so players stop polling it.
+        """
+        with self._lock:
+            self._finished = True
+            self._write_playlist()
+
+
+def _hls_js_script() -> str:
+    if os.path.isfile(constants.HLS_JS_LOCAL_PATH):
+        # Served by the app itself, so no third-party script runs on the page
+        return f'<script src="{html.escape(constants.HLS_JS_LOCAL_URL)}"></script>'
+    integrity = f' integrity="{html.escape(constants.HLS_JS_INTEGRITY)}" crossorigin="anonymous"' if constants.HLS_JS_INTEGRITY else ""
+    return f'<script src="{html.escape(constants.HLS_JS_URL)}"{integrity}></script>'
+
+
+def player_html(url: str, height: int = 360) -> str:
+    """
+    HTML for a video element playing the HLS playlist at `url`, via hls.js where the browser needs it.
+    """
+    return f"""
+<video id="player" controls playsinline style="width: 100%; height: {height}px; background: #000"></video>
+{_hls_js_script()}
+<script>
+  const video = document.getElementById("player");
+  const url = new URL({json.dumps(url)}, document.baseURI).href;
+  if (window.Hls && Hls.isSupported()) {{
+    // Start from the first scene rather than the live edge of the growing playlist
+    const hls = new Hls({{startPosition: 0}});
+    hls.loadSource(url);
+    hls.attachMedia(video);
+  }} else if (video.canPlayType("application/vnd.apple.mpegurl")) {{
+    video.src = url;
+  }}
+</script>
+"""
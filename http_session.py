@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from typing import Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+import constants
+from instrumentation import record_api_call, record_retry
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt: rate limiting and a Space that is restarting or overloaded
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (requests.HTTPError, httpx.HTTPStatusError)):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    # A POST that timed out after it was sent may still be running on the server, and a
+    # hung endpoint would hold the caller for one full read timeout per attempt
+    if isinstance(error, (requests.ReadTimeout, httpx.ReadTimeout, httpx.WriteTimeout)):
+        return False
+    # Requests that never reached the server are worth retrying, a malformed response is not
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        """
+        Stops calls to a service after `failure_threshold` consecutive failures.
+
+        While open, calls fail immediately. After `reset_seconds` one trial call is
+        let through; its success closes the breaker, its failure opens it again.
+
+        :param failure_threshold: Consecutive failed requests that open the breaker
+        :param reset_seconds: Time the breaker stays open before a trial call
+        """
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def allow(self) -> Tuple[bool, bool]:
+        """
+        :return: Whether the call may go ahead, and whether it is the half-open trial, which
+            must end in `record_success`, `record_failure` or `end_trial` with `trial=True`
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True, False
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False, False
+            self._trial_running = True
+            return True, True
+
+    def record_success(self, trial: bool = False):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            if trial:
+                self._trial_running = False
+
+    def record_failure(self, trial: bool = False):
+        # A call that started before the breaker opened does not end the trial running now
+        with self._lock:
+            self._failures += 1
+            if trial:
+                self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+
+    def end_trial(self):
+        """
+        Let another trial call through if the trial ended without recording an outcome.
+        Only the call `allow` made the trial may call this.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+
+class PooledHTTPClient:
+    def __init__(
+        self,
+        service: str,
+        pool_size: int = constants.HTTP_POOL_SIZE,
+        connect_timeout: float = constants.HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = constants.HTTP_READ_TIMEOUT,
+        max_retries: int = constants.HTTP_MAX_RETRIES,
+        retry_backoff: float = constants.HTTP_RETRY_BACKOFF,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        JSON-over-HTTP client with pooled keep-alive connections, timeouts, retries and a circuit breaker.
+
+        The sync side shares one `requests.Session` between all threads; the async side
+        keeps one `httpx.AsyncClient` per event loop. Connection errors, timeouts and
+        retryable statuses are retried with jittered exponential backoff.
+
+        :param service: Name used in metrics and logs
+        :param pool_size: Keep-alive connections kept per host
+        :param connect_timeout: Seconds to establish a connection
+        :param read_timeout: Seconds to wait for the response
+        :param max_retries: Extra attempts after the first one
+        :param retry_backoff: Base delay in seconds, doubled after every failed attempt
+        :param breaker: Circuit breaker guarding the service, a default one if not given
+        """
+        self.service = service
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker(constants.HTTP_BREAKER_FAILURES, constants.HTTP_BREAKER_RESET_SECONDS)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
+
+    def _delay(self, attempt: int) -> float:
+        # Jitter keeps sessions that failed together from retrying together
+        return self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _check_breaker(self) -> bool:
+        """
+        :return: Whether this call is the breaker's half-open trial
+        :raises CircuitOpenError: If the breaker is open
+        """
+        allowed, trial = self.breaker.allow()
+        if not allowed:
+            raise CircuitOpenError(f"{self.service} is unavailable, circuit open")
+        return trial
+
+    def post_json(self, url: str, payload: dict, headers: Optional[dict] = None) -> dict:
+        """
+        POST `payload` as JSON and return the decoded JSON response.
+
+        :raises CircuitOpenError: If the breaker is open
+        :raises requests.RequestException: If every attempt failed
+        """
+        trial = self._check_breaker()
+        try:
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                try:
+                    response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+                    response.raise_for_status()
+                    data = response.json()
+                except (requests.RequestException, ValueError) as e:
+                    record_api_call(self.service, time.perf_counter() - start, ok=False)
+                    if not _is_retryable(e) or attempt == self.max_retries:
+                        self.breaker.record_failure(trial)
+                        raise
+                    logger.warning(f"{self.service} request failed (attempt {attempt + 1}): {e}")
+                    record_retry(self.service)
+                    time.sleep(self._delay(attempt))
+                    continue
+                record_api_call(self.service, time.perf_counter() - start)
+                self.breaker.record_success(trial)
+                return data
+        finally:
+            # An unexpected exception must not leave a half-open breaker waiting on this call forever
+            if trial:
+                self.breaker.end_trial()
+
+    def _async_client(self) -> httpx.AsyncClient:
+        # An AsyncClient is bound to the loop it first ran on
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                connect_timeout, read_timeout = self.timeout
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                )
+            return client
+
+    async def apost_json(self, url: str, payload: dict, headers: Optional[dict] = None) -> dict:
+        """
+        Async version of `post_json`.
+
+        :raises CircuitOpenError: If the breaker is open
+        :raises httpx.HTTPError: If every attempt failed
+        """
+        trial = self._check_breaker()
+        try:
+            client = self._async_client()
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=payload, headers=headers)
+                    response.raise_for_status()
+                    data = response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    record_api_call(self.service, time.perf_counter() - start, ok=False)
+                    if not _is_retryable(e) or attempt == self.max_retries:
+                        self.breaker.record_failure(trial)
+                        raise
+                    logger.warning(f"{self.service} request failed (attempt {attempt + 1}): {e}")
+                    record_retry(self.service)
+                    await asyncio.sleep(self._delay(attempt))
+                    continue
+                record_api_call(self.service, time.perf_counter() - start)
+                self.breaker.record_success(trial)
+                return data
+        finally:
+            # Also covers a cancelled task, which raises CancelledError mid-request
+            if trial:
+                self.breaker.end_trial()
+
+    def close(self):
+        self.session.close()
+
+
+_summarization_client = None
+_summarization_client_lock = threading.Lock()
+
+
+def get_summarization_client() -> PooledHTTPClient:
+    """
+    Return the HTTP client for the summarization endpoint, shared by every session in the process.
+    """
+    global _summarization_client
+    with _summarization_client_lock:
+        if _summarization_client is None:
+            _summarization_client = PooledHTTPClient("summarizer", read_timeout=constants.SUMMARIZATION_READ_TIMEOUT)
+        return _summarization_client
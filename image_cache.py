@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional
+
+import constants
+from instrumentation import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    def __init__(
+        self,
+        directory: str = constants.IMAGE_CACHE_DIR,
+        max_bytes: int = constants.IMAGE_CACHE_MAX_BYTES,
+        namespace: str = constants.IMAGE_GENERATION_SPACE_NAME,
+    ):
+        """
+        Content-addressed on-disk cache of generated images.
+
+        Entries are keyed by a hash of the model/Space name and the prompt. File
+        modification times record recency, so the least recently used entries are
+        evicted once the cache grows past `max_bytes`. Entries are written to a
+        temporary file and renamed into place, so concurrent sessions and processes
+        never observe a partially written image.
+
+        :param directory: Folder holding the cached images
+        :param max_bytes: Size cap for all cached images together
+        :param namespace: Model or Space name mixed into every key
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, prompt: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, prompt: str) -> Optional[str]:
+        """
+        Return the cached image path for `prompt`, or None on a miss.
+        """
+        path = self._entry_path(self.key(prompt))
+        try:
+            # Touch the entry so it counts as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            record_cache("image", False)
+            return None
+        with self._lock:
+            self.hits += 1
+        record_cache("image", True)
+        return path
+
+    def put(self, prompt: str, source_path: str) -> str:
+        """
+        Store a copy of `source_path` as the image for `prompt` and return the cached path.
+        """
+        path = self._entry_path(self.key(prompt))
+        _atomic_copy(source_path, path)
+        self._evict()
+        return path
+
+    def materialize(self, cached_path: str, destination: str) -> str:
+        """
+        Place a copy of a cached image at `destination`.
+
+        A copy rather than a hard link: anything later written to `destination` in
+        place would otherwise overwrite the cache entry for every session.
+        """
+        _atomic_copy(cached_path, destination)
+        return destination
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".png"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        # Oldest access first
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Already evicted by another session
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        logger.info(f"Image cache trimmed to {total} bytes")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+def _atomic_copy(source: str, destination: str):
+    directory = os.path.dirname(destination) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """
+    Return the image cache shared by every session in the process.
+    """
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache()
+        return _image_cache
@@ -0,0 +1,105 @@
+import contextvars
+import logging
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Tuple, Union
+
+import constants
+from instrumentation import record_retry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImageGenerationError:
+    """
+    Structured result for a prompt whose image could not be generated.
+
+    Yielded in place of an image path so callers can tell failures apart
+    without inspecting dictionaries.
+    """
+    index: int
+    prompt: str
+    error: str
+    attempts: int
+
+    def __str__(self):
+        return f"Image {self.index} failed after {self.attempts} attempt(s): {self.error}"
+
+
+ImageResult = Union[str, ImageGenerationError]
+
+
+class ImageGenerationEngine:
+    def __init__(
+        self,
+        max_concurrency: int = constants.IMAGE_GENERATION_CONCURRENCY,
+        timeout: float = constants.IMAGE_GENERATION_TIMEOUT,
+        max_retries: int = constants.IMAGE_GENERATION_MAX_RETRIES,
+        retry_backoff: float = constants.IMAGE_GENERATION_RETRY_BACKOFF,
+    ):
+        """
+        Runs image generation for many prompts with a bounded number of requests in flight.
+
+        :param max_concurrency: Maximum number of generation requests running at once
+        :param timeout: Seconds allowed for a single attempt before it is abandoned
+        :param max_retries: Extra attempts made for an item after its first failure
+        :param retry_backoff: Base delay in seconds, doubled after every failed attempt
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+        self.max_retries = max(0, int(max_retries))
+        self.retry_backoff = retry_backoff
+
+    def _run_item(self, generate: Callable[[int, str, float], str], index: int, prompt: str) -> ImageResult:
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                return generate(index, prompt, self.timeout)
+            except Exception as e:
+                if attempts > self.max_retries:
+                    logger.error(f"Image {index} failed after {attempts} attempt(s): {e}")
+                    return ImageGenerationError(index=index, prompt=prompt, error=str(e) or type(e).__name__, attempts=attempts)
+                # Exponential backoff with jitter so parallel retries do not hit the Space together
+                delay = self.retry_backoff * (2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+                logger.warning(f"Image {index} attempt {attempts} failed ({e}), retrying in {delay:.1f}s")
+                record_retry("image_space")
+                time.sleep(delay)
+
+    def run(self, prompts: Iterable[str], generate: Callable[[int, str, float], str]) -> Iterator[Tuple[int, str, ImageResult]]:
+        """
+        Generate an image for every prompt, yielding results in prompt order.
+
+        Prompts are consumed lazily, so a generator that produces prompts over time
+        is streamed through the pool as items arrive.
+
+        :param prompts: Iterable of image prompts
+        :param generate: Callable taking (index, prompt, timeout) and returning an image path
+        :return: Iterator of (index, prompt, image path or ImageGenerationError)
+        """
+        # Completed items wait behind the head of the queue, so allow some slack
+        # beyond the worker count to keep every worker busy.
+        window = self.max_concurrency * 2
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="image-gen") as executor:
+            try:
+                for index, prompt in enumerate(prompts):
+                    pending.append((index, prompt, executor.submit(contextvars.copy_context().run, self._run_item, generate, index, prompt)))
+
+                    # Hand back finished items as early as ordering allows
+                    while pending and (len(pending) >= window or pending[0][2].done()):
+                        head_index, head_prompt, future = pending.popleft()
+                        yield head_index, head_prompt, future.result()
+
+                while pending:
+                    head_index, head_prompt, future = pending.popleft()
+                    yield head_index, head_prompt, future.result()
+            finally:
+                # The consumer stopped early; drop work that has not started yet
+                for _, _, future in pending:
+                    future.cancel()
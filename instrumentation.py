@@ -0,0 +1,342 @@
+"""
+Lightweight tracing and metrics for the pipeline stages.
+
+    with stage("encode") as span:
+        ...
+        span.set(frames=frame_count, bytes_out=os.path.getsize(path))
+
+    @stage("summarization")
+    def get_summarization(text): ...
+
+Every finished stage is logged as one JSON line tagged with the session ID and
+aggregated into process-wide metrics, which can be rendered in the Prometheus
+text format, written to a file or served over HTTP. Session IDs only appear in
+the JSON logs, never as metric labels, to keep metric cardinality bounded.
+When disabled, `stage` hands out a shared no-op span and nothing is recorded.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import constants
+
+logger = logging.getLogger("pipeline.metrics")
+
+_enabled = constants.INSTRUMENTATION_ENABLED
+_session_id = contextvars.ContextVar("session_id", default=None)
+
+
+def set_enabled(enabled: bool):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def bind_session(session_id: str):
+    """
+    Tag everything recorded from the current context with `session_id`.
+    Work handed to thread pools keeps the tag when submitted through `contextvars.copy_context().run`.
+    """
+    _session_id.set(session_id)
+
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.summaries = defaultdict(lambda: [0, 0.0])  # count, sum
+        self.gauges = {}
+
+    def inc(self, name, labels, value=1.0):
+        with self._lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            summary = self.summaries[(name, labels)]
+            summary[0] += 1
+            summary[1] += value
+
+    def set_gauge(self, name, labels, value):
+        with self._lock:
+            self.gauges[(name, labels)] = value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters), {key: list(value) for key, value in self.summaries.items()}, dict(self.gauges)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.summaries.clear()
+            self.gauges.clear()
+
+
+metrics = _Metrics()
+
+
+def _labels(**labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _log(event: str, **fields):
+    fields = {"event": event, "session_id": _session_id.get(), "ts": round(time.time(), 3), **fields}
+    logger.info(json.dumps(fields, default=str))
+
+
+class Span:
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self._start = None
+
+    def set(self, **attributes):
+        """
+        Attach measurements; `bytes_in`, `bytes_out`, `frames` and `retries` also feed the metrics.
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        status = "error" if exc_type else "ok"
+        labels = _labels(stage=self.name, status=status)
+        metrics.observe("pipeline_stage_seconds", labels, seconds)
+
+        stage_labels = _labels(stage=self.name)
+        for key in ("bytes_in", "bytes_out", "retries"):
+            if key in self.attributes:
+                metrics.inc(f"pipeline_{key}_total", stage_labels, self.attributes[key])
+        if "frames" in self.attributes:
+            metrics.inc("pipeline_frames_total", stage_labels, self.attributes["frames"])
+            if seconds > 0:
+                self.attributes["frames_per_second"] = round(self.attributes["frames"] / seconds, 1)
+                metrics.set_gauge("pipeline_frames_per_second", stage_labels, self.attributes["frames_per_second"])
+
+        fields = {"stage": self.name, "status": status, "seconds": round(seconds, 4), **self.attributes}
+        if exc_type:
+            fields["error"] = f"{exc_type.__name__}: {exc}"
+        _log("stage", **fields)
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class stage:
+    def __init__(self, name: str, **attributes):
+        """
+        Time a pipeline stage, as a context manager or as a decorator.
+
+        :param name: Stage name used as the metric label
+        :param attributes: Extra fields added to the stage's log line
+        """
+        self.name = name
+        self.attributes = attributes
+        self._span = None
+
+    def __enter__(self):
+        self._span = Span(self.name, dict(self.attributes)) if _enabled else _NOOP_SPAN
+        return self._span.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._span.__exit__(exc_type, exc, tb)
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Span(self.name, dict(self.attributes)):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+def record_api_call(service: str, seconds: float, ok: bool = True, **fields):
+    """
+    Record the latency of one outbound API request.
+    """
+    if not _enabled:
+        return
+    status = "ok" if ok else "error"
+    metrics.observe("pipeline_api_request_seconds", _labels(service=service, status=status), seconds)
+    _log("api_call", service=service, status=status, seconds=round(seconds, 4), **fields)
+
+
+def record_retry(service: str):
+    if not _enabled:
+        return
+    metrics.inc("pipeline_api_retries_total", _labels(service=service))
+
+
+def record_cache(cache: str, hit: bool):
+    if not _enabled:
+        return
+    metrics.inc("pipeline_cache_requests_total", _labels(cache=cache, result="hit" if hit else "miss"))
+
+
+class timed_api_call:
+    def __init__(self, service: str, **fields):
+        """
+        Context manager recording the latency and outcome of one outbound API request.
+        """
+        self.service = service
+        self.fields = fields
+
+    def __enter__(self):
+        self._start = time.perf_counter() if _enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._start is not None:
+            record_api_call(self.service, time.perf_counter() - self._start, ok=exc_type is None, **self.fields)
+        return False
+
+
+_HELP = {
+    "pipeline_stage_seconds": ("summary", "Wall time of pipeline stages"),
+    "pipeline_api_request_seconds": ("summary", "Latency of outbound API requests"),
+    "pipeline_api_retries_total": ("counter", "Retried outbound API requests"),
+    "pipeline_bytes_in_total": ("counter", "Bytes read by a stage"),
+    "pipeline_bytes_out_total": ("counter", "Bytes written by a stage"),
+    "pipeline_retries_total": ("counter", "Retries reported by a stage"),
+    "pipeline_frames_total": ("counter", "Video frames encoded by a stage"),
+    "pipeline_frames_per_second": ("gauge", "Encode throughput of the last run of a stage"),
+    "pipeline_cache_requests_total": ("counter", "Cache lookups by result"),
+}
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in labels)
+    return "{" + escaped + "}"
+
+
+def render_prometheus() -> str:
+    """
+    Render all metrics in the Prometheus text exposition format.
+    """
+    counters, summaries, gauges = metrics.snapshot()
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append((labels, [("", value)]))
+    for (name, labels), (count, total) in summaries.items():
+        by_name[name].append((labels, [("_count", count), ("_sum", total)]))
+    for (name, labels), value in gauges.items():
+        by_name[name].append((labels, [("", value)]))
+
+    lines = []
+    for name in sorted(by_name):
+        metric_type, help_text = _HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, samples in sorted(by_name[name]):
+            for suffix, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str = constants.METRICS_FILE):
+    """
+    Write the metrics to `path` atomically, for a node_exporter textfile collector or similar.
+    """
+    if not _enabled or not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+_writer_started = False
+_writer_lock = threading.Lock()
+
+
+def start_metrics_writer(path: str = constants.METRICS_FILE, interval: float = constants.METRICS_FILE_INTERVAL):
+    """
+    Rewrite the metrics file every `interval` seconds from a daemon thread. Safe to call repeatedly.
+    """
+    global _writer_started
+    if not _enabled or not path:
+        return
+    with _writer_lock:
+        if _writer_started:
+            return
+        _writer_started = True
+
+    def run():
+        while True:
+            time.sleep(max(1.0, interval))
+            try:
+                write_prometheus(path)
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {path}: {e}")
+
+    threading.Thread(target=run, daemon=True, name="metrics-writer").start()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = constants.METRICS_PORT):
+    """
+    Serve the metrics at http://0.0.0.0:<port>/metrics from a daemon thread. Safe to call repeatedly.
+    """
+    global _server
+    if not _enabled or not port:
+        return
+    with _server_lock:
+        if _server is not None:
+            return
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        except OSError as e:
+            logger.warning(f"Could not start metrics server on port {port}: {e}")
+            return
+        threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-server").start()
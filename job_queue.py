@@ -0,0 +1,531 @@
+"""
+Background render jobs for the Streamlit app.
+
+    job_id = submit_render_job(session_id, ingested_audio, groq_client)
+    get_job_queue().status(job_id)  # {"state": "running", "stage": "images", "progress": 0.4, ...}
+
+Jobs run on a fixed pool of worker threads behind a bounded queue, so a burst of
+users queues up instead of starting unbounded work, and a rerun of the script
+only polls the job instead of restarting stages. Encoding is CPU bound, so it is
+admitted through its own semaphore with fewer slots than there are workers;
+jobs waiting on the network keep running while encodes wait for a slot. Job
+state is written to one JSON file per job, so status survives a page reload.
+A job can be cancelled; a running one stops at its next stage or progress update.
+Finished jobs and the files of idle sessions are pruned at startup and after
+every job, see `JobQueue.prune`.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import constants
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("queued", "running")
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _newest_mtime(path: str) -> float:
+    newest = os.path.getmtime(path)
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+            except FileNotFoundError:
+                pass
+    return newest
+
+
+def _write_json(path: str, data):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+
+class Job:
+    def __init__(self, job_queue: "JobQueue", record: dict):
+        """
+        Handle passed to a running job for reporting progress and storing results.
+        """
+        self._queue = job_queue
+        self.id = record["id"]
+        self.session_id = record.get("session_id")
+        self.dir = job_queue.job_dir(self.id)
+        self.encode_admission = job_queue.encode_admission
+        self._cancel_requested = job_queue._cancel_requested[self.id]
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_requested.is_set()
+
+    def check_cancelled(self):
+        """
+        :raises JobCancelled: If the job was cancelled
+        """
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def update(self, **fields):
+        self._queue._update(self.id, **fields)
+
+    def set_result(self, **fields):
+        """
+        Store intermediate or final artifacts, visible to pollers right away.
+        """
+        self._queue._update(self.id, result=fields)
+
+    def progress(self, fraction: float, message: str = ""):
+        self.check_cancelled()
+        self.update(progress=round(min(max(fraction, 0.0), 1.0), 4), message=message)
+
+    @contextmanager
+    def stage(self, name: str, message: str = ""):
+        self.check_cancelled()
+        self.update(stage=name, message=message or f"{name.capitalize()}...")
+        start = time.perf_counter()
+        yield
+        self._queue._update(self.id, stage_seconds={name: round(time.perf_counter() - start, 3)})
+
+
+class JobQueue:
+    def __init__(
+        self,
+        workers: int = constants.JOB_WORKERS,
+        max_queued: int = constants.JOB_MAX_QUEUED,
+        encode_slots: int = constants.JOB_ENCODE_SLOTS,
+        directory: str = constants.JOB_DIR,
+        retention_hours: float = constants.JOB_RETENTION_HOURS,
+        keep_per_session: int = constants.JOB_KEEP_PER_SESSION,
+    ):
+        """
+        Fixed-size worker pool running jobs submitted from any session.
+
+        :param workers: Jobs running at the same time
+        :param max_queued: Jobs allowed to wait for a worker before `submit` refuses more
+        :param encode_slots: Encodes allowed at the same time across all jobs
+        :param directory: Folder holding one subfolder and state file per job
+        :param retention_hours: Finished jobs, and session files no recent job uses, are deleted after this, 0 keeps them
+        :param keep_per_session: Newest finished jobs kept per session, 0 for no cap
+        """
+        self.workers = max(1, int(workers))
+        self.max_queued = max(0, int(max_queued))
+        self.directory = directory
+        self.retention_seconds = max(0.0, float(retention_hours)) * 3600
+        self.keep_per_session = max(0, int(keep_per_session))
+        self.encode_admission = threading.BoundedSemaphore(max(1, int(encode_slots)))
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._cancel_requested = {}
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._recover()
+        self.prune()
+
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True, name=f"job-worker-{i}") for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id)
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), "job.json")
+
+    def _recover(self):
+        # Jobs that were queued or running when the process stopped will never finish
+        for job_id in os.listdir(self.directory):
+            record = self._load(job_id)
+            if record and record["state"] in ACTIVE_STATES:
+                record.update(state="failed", error="Interrupted by a server restart", updated_at=time.time())
+                _write_json(self._state_path(job_id), record)
+
+    def prune(self):
+        """
+        Delete finished jobs older than the retention or beyond the newest `keep_per_session` of their
+        session, then the audio, segments and streams of sessions without a queued, running or kept job
+        once nothing in them changed for the retention.
+        """
+        # Workers finishing at the same time only need one of them to prune
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self._prune()
+        except Exception:
+            # Pruning runs on the worker threads, which must outlive any filesystem hiccup
+            logger.exception("Could not prune finished jobs")
+        finally:
+            self._prune_lock.release()
+
+    def _prune(self):
+        from hls_stream import session_stream_dir
+
+        cutoff = time.time() - self.retention_seconds if self.retention_seconds else None
+        with self._lock:
+            # A scene edit reads the job it started from, so that one is kept until the edit finishes
+            protected = set(self._jobs) | {record.get("source_job_id") for record in self._jobs.values()}
+            sessions = {record.get("session_id") or "anonymous" for record in self._jobs.values()}
+
+        expired = []
+        finished = {}
+        for job_id in os.listdir(self.directory):
+            if job_id in protected:
+                continue
+            record = self._load(job_id)
+            if record is None:
+                # Left behind by a crash, or a job being submitted right now
+                path = self.job_dir(job_id)
+                if cutoff and os.path.isdir(path) and _newest_mtime(path) < cutoff:
+                    expired.append((job_id, None))
+                continue
+            session_id = record.get("session_id") or "anonymous"
+            if record["state"] in ACTIVE_STATES:
+                sessions.add(session_id)
+            elif cutoff and record["updated_at"] < cutoff:
+                expired.append((job_id, session_id))
+            else:
+                finished.setdefault(session_id, []).append(record)
+
+        for session_id, records in finished.items():
+            sessions.add(session_id)
+            if self.keep_per_session:
+                records.sort(key=lambda record: record["created_at"], reverse=True)
+                expired += [(record["id"], session_id) for record in records[self.keep_per_session:]]
+
+        for job_id, session_id in expired:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+            if session_id:
+                stream_dir = session_stream_dir(session_id, job_id)
+                shutil.rmtree(stream_dir, ignore_errors=True)
+                try:
+                    os.rmdir(os.path.dirname(stream_dir))
+                except OSError:
+                    pass  # The session still has other streams
+        if expired:
+            logger.info(f"Pruned {len(expired)} finished jobs")
+
+        if cutoff is None:
+            return
+        for root in (constants.AUDIO_INGEST_DIR, constants.SCENE_ARTIFACT_DIR, constants.STREAM_DIR):
+            if not os.path.isdir(root):
+                continue
+            for session_id in os.listdir(root):
+                path = os.path.join(root, session_id)
+                if session_id not in sessions and os.path.isdir(path) and _newest_mtime(path) < cutoff:
+                    logger.info(f"Pruning idle session files {path}")
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(self._state_path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            return None
+
+    def _update(self, job_id: str, stage_seconds: dict = None, result: dict = None, **fields):
+        with self._lock:
+            record = self._jobs[job_id]
+            record.update(fields, updated_at=time.time())
+            if stage_seconds:
+                record["stage_seconds"].update(stage_seconds)
+            if result:
+                record["result"].update(result)
+            _write_json(self._state_path(job_id), record)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(record["state"] == "queued" for record in self._jobs.values())
+
+    def submit(self, run: Callable[[Job], None], session_id: Optional[str] = None, **metadata) -> str:
+        """
+        Queue `run(job)` and return the job ID.
+
+        :raises JobQueueFull: If `max_queued` jobs are already waiting
+        """
+        job_id = uuid.uuid4().hex
+        record = {
+            "id": job_id, "session_id": session_id, "state": "queued", "stage": None,
+            "message": "Waiting for a free worker...", "progress": 0.0, "stage_seconds": {},
+            "result": {}, "error": None, "created_at": time.time(), "updated_at": time.time(), **metadata,
+        }
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        with self._lock:
+            queued = sum(job["state"] == "queued" for job in self._jobs.values())
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"{queued} jobs are already waiting")
+            self._jobs[job_id] = record
+            self._cancel_requested[job_id] = threading.Event()
+            _write_json(self._state_path(job_id), record)
+        self._queue.put((job_id, run))
+        logger.info(f"Queued job {job_id} ({queued + 1} waiting)")
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job; a running job stops at its next stage or progress update.
+
+        :return: False if the job already finished or is unknown
+        """
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None:
+                return False
+            self._cancel_requested[job_id].set()
+            if record["state"] == "queued":
+                record.update(state="cancelled", message="Cancelled", updated_at=time.time())
+            else:
+                record.update(message="Cancelling...", updated_at=time.time())
+            _write_json(self._state_path(job_id), record)
+        logger.info(f"Cancelling job {job_id}")
+        return True
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """
+        Return a snapshot of the job's state, read from disk for jobs of an earlier process.
+        """
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is not None:
+                return json.loads(json.dumps(record, default=str))
+        return self._load(job_id)
+
+    def _work(self):
+        while True:
+            job_id, run = self._queue.get()
+            try:
+                self._run(job_id, run)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str, run: Callable[[Job], None]):
+        with self._lock:
+            record = self._jobs[job_id]
+            cancelled_while_queued = record["state"] == "cancelled"
+        try:
+            if cancelled_while_queued:
+                return
+            self._update(job_id, state="running", started_at=time.time())
+            job = Job(self, record)
+            context = contextvars.copy_context()
+            try:
+                context.run(instrumentation.bind_session, record.get("session_id"))
+                context.run(run, job)
+                self._update(job_id, state="done", stage=None, progress=1.0, message="Done")
+            except Exception as e:
+                # Files of a cancelled job may be deleted under it, so any error after a cancel is the cancel
+                if job.cancelled:
+                    logger.info(f"Job {job_id} cancelled")
+                    self._update(job_id, state="cancelled", stage=None, message="Cancelled")
+                else:
+                    logger.exception(f"Job {job_id} failed")
+                    self._update(job_id, state="failed", error=f"{type(e).__name__}: {e}")
+        finally:
+            # Finished jobs are served from their state file
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._cancel_requested.pop(job_id, None)
+            self.prune()
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Return the job queue shared by every session in the process.
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
+
+
+def submit_render_job(session_id: str, audio, groq_client) -> str:
+    """
+    Queue the full audio-to-video render of an ingested audio file.
+
+    :raises JobQueueFull: If the queue is at capacity
+    """
+    return get_job_queue().submit(
+        lambda job: run_render_job(job, audio, groq_client), session_id=session_id, audio=audio.name
+    )
+
+
+def run_render_job(job: Job, audio, groq_client):
+    """
+    Transcribe, plan, summarize, prompt and render, publishing each artifact as it is ready.
+    """
+    from chunked_transcription import transcribe_audio_chunked
+    from ffmpeg_encoder import parse_renditions, rendition_path
+    from hls_stream import session_stream_dir, stream_url
+    from image_generation_engine import ImageGenerationError
+    from pipeline import RenderPipeline
+    from scene_artifacts import session_segment_dir
+    from scene_planner import plan_scenes
+    from transcription import transcribe_audio
+    from utils import (
+        generate_video, get_image_prompts, get_summarization, iter_image_prompts_windowed, segments_to_chunks,
+        successful_image_paths,
+    )
+
+    with job.stage("transcription", "Transcribing audio..."), audio.buffer() as file_bytes:
+        if constants.TRANSCRIPTION_MODE == "chunked":
+            result = transcribe_audio_chunked(groq_client, audio.name, file_bytes, file_path=audio.path, content_hash=audio.sha256)
+        else:
+            result = transcribe_audio(groq_client, audio.name, file_bytes, content_hash=audio.sha256)
+    scenes = plan_scenes(result["segments"])
+    job.set_result(transcript=result["text"], segments=result["segments"], scenes=scenes)
+    job.progress(0.1)
+
+    with job.stage("summarization", "Generating summary..."):
+        summary = get_summarization(result["text"])
+    chunks = segments_to_chunks(scenes)
+    if constants.PROMPT_GENERATION_MODE == "windowed":
+        # Prompts stream into image generation window by window, so the first images
+        # are generated while later windows are still being prompted
+        job.set_result(summary=summary)
+        image_prompts = []
+
+        def stream_prompts():
+            for prompt in iter_image_prompts_windowed(chunks, summary):
+                image_prompts.append(prompt)
+                yield prompt
+            job.set_result(image_prompts=image_prompts)
+        prompts = stream_prompts()
+        prompt_count = len(chunks)
+    else:
+        with job.stage("prompts", "Generating image prompts..."):
+            image_prompts = prompts = get_image_prompts(chunks, summary)["image_prompts"]
+        job.set_result(summary=summary, image_prompts=image_prompts)
+        prompt_count = len(image_prompts)
+    job.progress(0.2)
+
+    generated_images = []
+    image_results = []
+
+    def on_image(index, prompt, image_path):
+        image_results.append((prompt, image_path))
+        generated_images.append(
+            {"prompt": prompt, "path": None, "error": str(image_path)} if isinstance(image_path, ImageGenerationError)
+            else {"prompt": prompt, "path": image_path, "error": None}
+        )
+        job.set_result(images=generated_images)
+        # Images and their segment encodes overlap, so image progress stands for the render
+        done = index + 1
+        message = f"Generated image {done} of {prompt_count}" if done < prompt_count else "Encoding video..."
+        job.progress(0.2 + 0.75 * done / prompt_count, message)
+
+    def on_stream(playlist_path, published, total):
+        job.set_result(stream_url=stream_url(playlist_path), stream_segments=published, stream_total=total)
+
+    video_path = os.path.join(job.dir, "video.mp4")
+    renditions = parse_renditions(constants.VIDEO_RENDITIONS)
+    stream_dir = session_stream_dir(job.session_id or "anonymous", job.id) if constants.STREAM_OUTPUT else None
+    with job.stage("render", "Generating images..."):
+        try:
+            pipeline_result = RenderPipeline(encode_admission=job.encode_admission, renditions=renditions).run(
+                prompts=prompts, segments=scenes, audio_path=audio.path, output_path=video_path,
+                folder_name=os.path.join(job.dir, "images"), on_image=on_image,
+                stream_dir=stream_dir, on_stream=on_stream, segment_dir=session_segment_dir(job.session_id or "anonymous"),
+            )
+            rendered_path = pipeline_result.video_path
+            rendition_paths = pipeline_result.renditions
+            if pipeline_result.manifest:
+                job.set_result(scene_manifest=pipeline_result.manifest.save(job.dir))
+        except JobCancelled:
+            raise
+        except Exception as e:
+            job.check_cancelled()
+            logger.error(f"Pipelined rendering failed, falling back to a sequential render: {e}")
+            # Failed images borrow a neighbour's, so every later image stays on its own scene
+            image_paths = successful_image_paths(image_results)
+            if not image_paths:
+                raise
+            job.update(message="Encoding video...")
+            with job.encode_admission:
+                rendered_path = generate_video(
+                    audio.path, image_paths, scenes, output_path=video_path, renditions=renditions
+                )
+            rendition_paths = {
+                rendition.name: rendition_path(video_path, rendition.name) for rendition in renditions
+            } if rendered_path else {}
+    if not rendered_path:
+        raise RuntimeError("No video was rendered, every image failed to generate")
+    job.set_result(video_path=rendered_path, renditions=rendition_paths)
+
+
+def submit_scene_rerender_job(session_id: str, source_job_id: str, scene_index: int, prompt: str, regenerate: bool = False) -> str:
+    """
+    Queue a re-render of one scene of a finished render job with a new image.
+
+    :raises JobQueueFull: If the queue is at capacity
+    """
+    return get_job_queue().submit(
+        lambda job: run_scene_rerender_job(job, source_job_id, scene_index, prompt, regenerate),
+        session_id=session_id, source_job_id=source_job_id, scene=scene_index,
+    )
+
+
+def run_scene_rerender_job(job: Job, source_job_id: str, scene_index: int, prompt: str, regenerate: bool = False):
+    """
+    Regenerate one scene's image, encode only its segment and re-join the video, keeping every other artifact.
+    """
+    from ffmpeg_encoder import parse_renditions
+    from pipeline import RenderPipeline
+    from scene_artifacts import SceneManifest, session_segment_dir
+
+    job_queue = get_job_queue()
+    source = job_queue.status(source_job_id)
+    manifest = SceneManifest.load(job_queue.job_dir(source_job_id))
+    if source is None or manifest is None:
+        raise RuntimeError(f"Job {source_job_id} kept no scene artifacts, the whole video has to be rendered again")
+
+    # Everything but the edited scene carries over; the preview stream belongs to the source render
+    result = {key: value for key, value in source["result"].items() if not key.startswith("stream_")}
+    job.set_result(**result)
+
+    video_path = os.path.join(job.dir, "video.mp4")
+    pipeline = RenderPipeline(
+        width=manifest.width, height=manifest.height, fps=manifest.fps,
+        encode_admission=job.encode_admission, renditions=parse_renditions(",".join(manifest.renditions)),
+    )
+    with job.stage("render", "Generating the new image..."):
+        pipeline_result = pipeline.rerender_scene(
+            manifest, scene_index, prompt, output_path=video_path, folder_name=os.path.join(job.dir, "images"),
+            segment_dir=session_segment_dir(job.session_id or "anonymous"), regenerate=regenerate,
+        )
+
+    image_path = manifest.scenes[scene_index]["image_path"]
+    image_prompts = list(result.get("image_prompts") or [])
+    images = list(result.get("images") or [])
+    if scene_index < len(image_prompts):
+        image_prompts[scene_index] = prompt
+    if scene_index < len(images):
+        images[scene_index] = {"prompt": prompt, "path": image_path, "error": None}
+    job.set_result(
+        image_prompts=image_prompts, images=images, video_path=pipeline_result.video_path,
+        renditions=pipeline_result.renditions, scene_manifest=manifest.save(job.dir),
+    )
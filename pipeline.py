@@ -0,0 +1,338 @@
+import contextvars
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+import constants
+from ffmpeg_encoder import FPS, Rendition, encode_segment, join_segments, rendition_path, segment_durations, segment_frame_counts
+from frame_preparation import FRAME_HEIGHT, FRAME_WIDTH, letterbox
+from hls_stream import HLSStream
+from image_cache import get_image_cache
+from image_generation_engine import ImageGenerationError, ImageResult
+from instrumentation import stage
+from scene_artifacts import SceneManifest, file_sha256, segment_key
+from utils import generate_images
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _encode_executor(workers: int):
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="segment-encode")
+    try:
+        yield executor
+    except BaseException:
+        # An abandoned run (a failure or a cancelled job) drops the encodes that have not started
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+@dataclass
+class PipelineResult:
+    video_path: Optional[str]
+    generated_images: List[Tuple[str, ImageResult]]
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    renditions: Dict[str, str] = field(default_factory=dict)  # rendition name -> video path
+    playlist_path: Optional[str] = None  # HLS playlist of the same video, when streamed
+    manifest: Optional[SceneManifest] = None  # what each scene is made of, when segments are kept
+
+
+class RenderPipeline:
+    def __init__(
+        self,
+        encode_workers: int = constants.PIPELINE_ENCODE_WORKERS,
+        width: int = FRAME_WIDTH,
+        height: int = FRAME_HEIGHT,
+        fps: int = FPS,
+        encode_admission: Optional[threading.Semaphore] = None,
+        renditions: Sequence[Rendition] = (),
+    ):
+        """
+        Streams work from image generation into per-segment encoding.
+
+        Each image is letterboxed and its segment encoded as soon as it arrives, while
+        later images are still being generated. The encoded segments are joined without
+        re-encoding at the end, so the time to a finished video tracks the slowest
+        stage rather than the sum of all stages.
+
+        :param encode_workers: Segments encoded at the same time
+        :param width: Output frame width
+        :param height: Output frame height
+        :param fps: Output frame rate
+        :param encode_admission: Semaphore shared with other renders, held during every encode
+        :param renditions: Extra output sizes split off each segment's encode, see `ffmpeg_encoder.RENDITIONS`
+        """
+        self.encode_workers = max(1, int(encode_workers))
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.encode_admission = encode_admission or nullcontext()
+        self.renditions = list(renditions)
+
+    def segment_key(self, image_sha256: str, frame_count: int) -> str:
+        return segment_key(
+            image_sha256, frame_count, self.fps, self.width, self.height, [rendition.name for rendition in self.renditions]
+        )
+
+    def _encode_segment(self, frame, frame_count, segment_path, keep=False):
+        if not keep:
+            with self.encode_admission:
+                return encode_segment(frame, frame_count, segment_path, self.fps, renditions=self.renditions)
+
+        # Kept segments may be shared between renders, so they are encoded under a
+        # temporary name and renamed into place, renditions first: the main file
+        # existing means the whole set is complete
+        tmp_path = f"{os.path.splitext(segment_path)[0]}.{uuid.uuid4().hex}.tmp.mp4"
+        with self.encode_admission:
+            encode_segment(frame, frame_count, tmp_path, self.fps, renditions=self.renditions)
+        for rendition in self.renditions:
+            os.replace(rendition_path(tmp_path, rendition.name), rendition_path(segment_path, rendition.name))
+        os.replace(tmp_path, segment_path)
+        return segment_path
+
+    def join(self, segment_paths: List[str], audio_path: str, output_path: str, total_duration: float) -> Dict[str, str]:
+        """
+        Join encoded segments, and the same segments of every rendition, without re-encoding them.
+
+        :return: Mapping of rendition name to its video path
+        """
+        renditions = {}
+        with self.encode_admission:
+            join_segments(segment_paths, audio_path, output_path, total_duration=total_duration)
+            for rendition in self.renditions:
+                renditions[rendition.name] = join_segments(
+                    [rendition_path(path, rendition.name) for path in segment_paths], audio_path,
+                    rendition_path(output_path, rendition.name), total_duration=total_duration,
+                )
+        return renditions
+
+    def run(
+        self,
+        prompts: Iterable[str],
+        segments: List[dict],
+        audio_path: str,
+        output_path: str,
+        folder_name: str = "test_folder",
+        on_image: Optional[Callable[[int, str, ImageResult], None]] = None,
+        stream_dir: Optional[str] = None,
+        on_stream: Optional[Callable[[str, int, int], None]] = None,
+        segment_dir: Optional[str] = None,
+    ) -> PipelineResult:
+        """
+        Generate the images for `prompts` and render them over `segments` into `output_path`.
+
+        `prompts` may be a generator; prompts are pulled as the image stage has room for them.
+        Segment `i` shows image `i`, the last image covers any segments beyond the prompt count,
+        and a failed image is replaced by the nearest earlier image (or the next one, if none).
+
+        :param on_image: Called in the caller's thread with (index, prompt, image path or error)
+        :param stream_dir: Folder for an HLS playlist that gains each segment as soon as it and all
+            earlier ones are encoded, so playback can start before the video is joined
+        :param on_stream: Called from an encode thread with (playlist path, segments published, total)
+        :param segment_dir: Folder keeping the encoded segments by content key, so segments already in it
+            are reused and `rerender_scene` can later redo a single scene; the result then has a manifest
+        """
+        durations = segment_durations(segments)
+        frame_counts = segment_frame_counts(durations, self.fps)
+        stream = HLSStream(
+            stream_dir, [count / self.fps for count in frame_counts], audio_path, on_publish=on_stream
+        ) if stream_dir else None
+        generated_images = []
+        frames = {}
+        image_hashes = {}
+        scene_images = {}
+        encodes = {}
+        waiting = []
+        last_image = None
+        timings = {}
+        start = time.perf_counter()
+        if segment_dir:
+            os.makedirs(segment_dir, exist_ok=True)
+
+        with stage("render_pipeline") as span, tempfile.TemporaryDirectory(prefix="pipeline_") as work_dir, \
+                _encode_executor(self.encode_workers) as executor:
+
+            def encode(segment_index, frame, segment_path):
+                # No frame means the segment is already in segment_dir
+                if frame is not None:
+                    self._encode_segment(frame, frame_counts[segment_index], segment_path, keep=segment_dir is not None)
+                if stream:
+                    try:
+                        stream.add_segment(segment_index, segment_path)
+                    except Exception as e:
+                        # The stream is only a preview, the joined video does not depend on it
+                        logger.error(f"Could not stream segment {segment_index}: {e}")
+                return segment_path
+
+            def submit(segment_index, image_path):
+                # Segments shorter than half a frame vanish on the frame grid
+                if frame_counts[segment_index] == 0:
+                    return
+                # Cache hits are copies at their own paths, so frames are shared by image content
+                if image_path not in image_hashes:
+                    image_hashes[image_path] = file_sha256(image_path)
+                key = image_hashes[image_path]
+                scene_images[segment_index] = image_path
+                if segment_dir:
+                    segment_path = os.path.join(segment_dir, f"{self.segment_key(key, frame_counts[segment_index])}.mp4")
+                else:
+                    segment_path = os.path.join(work_dir, f"segment_{segment_index:05d}.mp4")
+                frame = None
+                if not (segment_dir and os.path.exists(segment_path)):
+                    if key not in frames:
+                        with Image.open(image_path) as image:
+                            frames[key] = letterbox(image, self.width, self.height)
+                    frame = frames[key]
+                encodes[segment_index] = executor.submit(
+                    contextvars.copy_context().run, encode, segment_index, frame, segment_path
+                )
+
+            for prompt, image_path in generate_images(prompts, folder_name=folder_name):
+                index = len(generated_images)
+                generated_images.append((prompt, image_path))
+                if index == 0:
+                    timings["first_image"] = time.perf_counter() - start
+                if on_image:
+                    on_image(index, prompt, image_path)
+                if index >= len(segments):
+                    continue
+
+                if isinstance(image_path, ImageGenerationError):
+                    if last_image:
+                        submit(index, last_image)
+                    else:
+                        waiting.append(index)
+                    continue
+
+                for segment_index in waiting + [index]:
+                    submit(segment_index, image_path)
+                waiting = []
+                last_image = image_path
+            timings["images"] = time.perf_counter() - start
+
+            if last_image is None:
+                logger.error("No images were generated, skipping video rendering.")
+                return PipelineResult(video_path=None, generated_images=generated_images, stage_seconds=timings)
+
+            # Segments beyond the number of prompts keep showing the last image
+            for segment_index in waiting + list(range(len(generated_images), len(segments))):
+                submit(segment_index, last_image)
+
+            segment_paths = [encodes[segment_index].result() for segment_index in sorted(encodes)]
+            timings["encode"] = time.perf_counter() - start
+
+            renditions = self.join(segment_paths, audio_path, output_path, total_duration=sum(frame_counts) / self.fps)
+            if stream:
+                stream.finish()
+            timings["total"] = time.perf_counter() - start
+            span.set(segments=len(segments), frames=sum(frame_counts), bytes_out=os.path.getsize(output_path))
+
+        manifest = None
+        if segment_dir:
+            manifest = SceneManifest(
+                audio_path=audio_path, fps=self.fps, width=self.width, height=self.height,
+                renditions=[rendition.name for rendition in self.renditions],
+            )
+            for index, segment in enumerate(segments):
+                prompt, image_result = generated_images[index] if index < len(generated_images) else (None, None)
+                image_path = scene_images.get(index)
+                manifest.scenes.append({
+                    "start": segment["start"], "end": segment["end"], "text": segment["text"], "prompt": prompt,
+                    "image_path": image_path,
+                    "image_sha256": image_hashes[image_path] if image_path else None,
+                    "image_error": str(image_result) if isinstance(image_result, ImageGenerationError) else None,
+                    "frame_count": frame_counts[index],
+                    "segment_key": os.path.splitext(os.path.basename(encodes[index].result()))[0] if index in encodes else None,
+                    "segment_path": encodes[index].result() if index in encodes else None,
+                })
+
+        logger.info(f"Pipeline finished: {timings}")
+        return PipelineResult(
+            video_path=output_path, generated_images=generated_images, stage_seconds=timings, renditions=renditions,
+            playlist_path=stream.playlist_path if stream else None, manifest=manifest,
+        )
+
+    def rerender_scene(
+        self,
+        manifest: SceneManifest,
+        scene_index: int,
+        prompt: str,
+        output_path: str,
+        folder_name: str,
+        segment_dir: str,
+        regenerate: bool = False,
+    ) -> PipelineResult:
+        """
+        Give one scene of a rendered video a new image and re-join the video.
+
+        Only that scene's image is generated and only its segment encoded; every other
+        segment is reused as it is. A segment missing from disk is encoded again from
+        its scene's image. `manifest` is updated in place. The pipeline must have the
+        size, frame rate and renditions the manifest was rendered with.
+
+        :param manifest: Manifest of the rendered video, from `run`
+        :param scene_index: Scene to change
+        :param prompt: Prompt for the scene's new image
+        :param output_path: Where to write the new video
+        :param folder_name: Folder for the new image
+        :param segment_dir: Folder keeping the encoded segments by content key
+        :param regenerate: Generate a new image even if one for `prompt` is cached, replacing the cached one
+        :raises RuntimeError: If the image could not be generated
+        """
+        timings = {}
+        start = time.perf_counter()
+        os.makedirs(segment_dir, exist_ok=True)
+
+        with stage("scene_rerender", scene=scene_index, regenerate=regenerate) as span:
+            [(prompt, image_path)] = list(generate_images([prompt], folder_name=folder_name, use_cache=not regenerate))
+            if isinstance(image_path, ImageGenerationError):
+                raise RuntimeError(f"Could not generate the image for scene {scene_index}: {image_path}")
+            if regenerate:
+                # The new image replaces the one that was rejected for later renders as well
+                get_image_cache().put(prompt, image_path)
+            manifest.scenes[scene_index].update(
+                prompt=prompt, image_path=image_path, image_sha256=file_sha256(image_path), image_error=None
+            )
+            timings["images"] = time.perf_counter() - start
+
+            encodes = {}
+            with _encode_executor(self.encode_workers) as executor:
+                for index, scene in enumerate(manifest.scenes):
+                    if not scene["frame_count"]:
+                        continue
+                    key = self.segment_key(scene["image_sha256"], scene["frame_count"])
+                    segment_path = os.path.join(segment_dir, f"{key}.mp4")
+                    scene.update(segment_key=key)
+                    if os.path.exists(segment_path):
+                        scene.update(segment_path=segment_path)
+                        continue
+                    with Image.open(scene["image_path"]) as image:
+                        frame = letterbox(image, self.width, self.height)
+                    encodes[index] = executor.submit(
+                        contextvars.copy_context().run, self._encode_segment, frame, scene["frame_count"], segment_path, True
+                    )
+                for index, encode in encodes.items():
+                    manifest.scenes[index].update(segment_path=encode.result())
+            timings["encode"] = time.perf_counter() - start
+
+            segment_paths = [scene["segment_path"] for scene in manifest.scenes if scene["frame_count"]]
+            renditions = self.join(segment_paths, manifest.audio_path, output_path, total_duration=manifest.total_duration)
+            timings["total"] = time.perf_counter() - start
+            span.set(segments=len(encodes), bytes_out=os.path.getsize(output_path))
+
+        logger.info(f"Re-rendered scene {scene_index}, encoding {len(encodes)} segment(s): {timings}")
+        return PipelineResult(
+            video_path=output_path, generated_images=[(prompt, image_path)], stage_seconds=timings,
+            renditions=renditions, manifest=manifest,
+        )
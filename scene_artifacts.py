@@ -0,0 +1,89 @@
+"""
+Per-scene artifacts of a render, so one scene can be redone without redoing the others.
+
+A render writes a scenes.json manifest next to its video, recording for every
+scene the prompt, the image it shows and its encoded segment. Images are
+identified by the SHA-256 of their content and segments by a key over the image
+hash and everything that shapes the encode, so a segment is only encoded again
+when its image or timing actually changed. Segments are kept per session and
+shared by all of its renders.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Sequence
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "scenes.json"
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def segment_key(image_sha256: str, frame_count: int, fps: int, width: int, height: int, renditions: Sequence[str] = ()) -> str:
+    """
+    Content key of an encoded segment: the same image held for the same frames at the same output settings.
+    """
+    parts = [image_sha256, str(frame_count), str(fps), f"{width}x{height}", ",".join(renditions)]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def session_segment_dir(session_id: str) -> str:
+    return os.path.join(constants.SCENE_ARTIFACT_DIR, session_id, "segments")
+
+
+def release_session_segments(session_id: str):
+    """
+    Delete every segment encoded for the session.
+    """
+    shutil.rmtree(os.path.join(constants.SCENE_ARTIFACT_DIR, session_id), ignore_errors=True)
+
+
+@dataclass
+class SceneManifest:
+    """
+    What every scene of a rendered video is made of.
+
+    Each scene is a dictionary with the scene's `start`, `end` and `text`, plus its
+    `prompt`, `image_path`, `image_sha256`, `image_error`, `frame_count`,
+    `segment_key` and `segment_path` (None for scenes too short for a frame).
+    """
+    audio_path: str
+    fps: int
+    width: int
+    height: int
+    renditions: List[str] = field(default_factory=list)
+    scenes: List[dict] = field(default_factory=list)
+
+    @property
+    def total_duration(self) -> float:
+        return sum(scene["frame_count"] for scene in self.scenes) / self.fps
+
+    def save(self, directory: str) -> str:
+        path = os.path.join(directory, MANIFEST_NAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["SceneManifest"]:
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME)) as f:
+                return cls(**json.load(f))
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,96 @@
+import logging
+import re
+from typing import List, Optional
+
+import constants
+from ffmpeg_encoder import segment_durations
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def _words(text: str) -> set:
+    # Short words ("a", "of", "to") say nothing about what is on screen
+    return {word for word in _WORD.findall(text.lower()) if len(word) > 2}
+
+
+def text_similarity(a: str, b: str) -> float:
+    """
+    Jaccard similarity of the words of `a` and `b`, from 0 (disjoint) to 1 (same words).
+    """
+    words_a, words_b = _words(a), _words(b)
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def _scene(segments: List[dict], indices: List[int]) -> dict:
+    return {
+        "start": segments[indices[0]]["start"],
+        "end": segments[indices[-1]]["end"],
+        "text": " ".join(segments[i]["text"].strip() for i in indices),
+        "segment_indices": list(indices),
+    }
+
+
+def plan_scenes(
+    segments: List[dict],
+    target_scene_seconds: float = constants.SCENE_TARGET_SECONDS,
+    max_images: Optional[int] = constants.SCENE_MAX_IMAGES,
+    similarity_threshold: float = constants.SCENE_SIMILARITY_THRESHOLD,
+) -> List[dict]:
+    """
+    Merge adjacent transcription segments into scenes, each getting one image.
+
+    Segments are added to a scene until it lasts at least `target_scene_seconds`.
+    When `similarity_threshold` is set, a segment whose words overlap the current
+    scene at least that much is kept in it up to twice the target length, so one
+    topic is not split across two images. A trailing scene shorter than half the
+    target joins the previous one. If more than `max_images` scenes remain, the
+    adjacent pair with the shortest combined duration is merged until it fits.
+
+    Scenes have the same shape as segments (`start`, `end`, `text`), plus the
+    `segment_indices` they cover, so they can be passed anywhere segments are.
+
+    :param segments: Transcription segments in timeline order
+    :param target_scene_seconds: Minimum scene length, 0 keeps every segment as its own scene
+    :param max_images: Upper bound on the number of scenes, 0 or None for no bound
+    :param similarity_threshold: Word overlap (0-1) that keeps a segment in the current scene, 0 to disable
+    :return: List of scene dictionaries in timeline order
+    """
+    if not segments:
+        return []
+
+    groups = []
+    current = [0]
+    for i in range(1, len(segments)):
+        # Each segment lasts until the next one starts, so this is the scene's length if it ends here
+        length = segments[i]["start"] - segments[current[0]]["start"]
+        if length < target_scene_seconds:
+            current.append(i)
+            continue
+        if similarity_threshold and length < 2 * target_scene_seconds:
+            scene_text = " ".join(segments[j]["text"] for j in current)
+            if text_similarity(scene_text, segments[i]["text"]) >= similarity_threshold:
+                current.append(i)
+                continue
+        groups.append(current)
+        current = [i]
+
+    if groups and segments[current[-1]]["end"] - segments[current[0]]["start"] < target_scene_seconds / 2:
+        groups[-1].extend(current)
+    else:
+        groups.append(current)
+
+    if max_images:
+        while len(groups) > max_images:
+            durations = segment_durations([_scene(segments, group) for group in groups])
+            shortest = min(range(len(groups) - 1), key=lambda k: durations[k] + durations[k + 1])
+            groups[shortest:shortest + 2] = [groups[shortest] + groups[shortest + 1]]
+
+    scenes = [_scene(segments, group) for group in groups]
+    for index, scene in enumerate(scenes):
+        scene["id"] = index
+    logger.info(f"Planned {len(scenes)} scenes from {len(segments)} segments")
+    return scenes
@@ -1,9 +1,13 @@
-from typing import Type, Optional
+import threading
+from typing import Dict, List, Type, Optional
 from pydantic import BaseModel
+from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from typing import TypedDict
 import constants  # Assuming constants.py holds LLM provider configurations
 from langchain_groq import ChatGroq
+from instrumentation import timed_api_call
 
 
 # Define the State structure (similar to previous definition)
@@ -17,6 +21,9 @@ class StructuredOutputExtractor:
     def __init__(self, response_schema: Type[BaseModel]):
         """
         Initializes the extractor for any given structured output model.
+
+        The model client and compiled graph hold no per-query state, so one instance
+        can serve concurrent queries from many threads; use `get_extractor` to share it.
         
         :param response_schema: Pydantic model class used for structured output extraction
         """
@@ -39,7 +46,7 @@ class StructuredOutputExtractor:
         graph_builder = StateGraph(State)
 
         # Add nodes and edges for structured output
-        graph_builder.add_node("extract", self._extract_structured_info)
+        graph_builder.add_node("extract", RunnableLambda(self._extract_structured_info, afunc=self._aextract_structured_info))
         graph_builder.add_edge(START, "extract")
         graph_builder.add_edge("extract", END)
 
@@ -56,13 +63,32 @@ class StructuredOutputExtractor:
         print(f"Processing query: {query}")
         try:
             # Extract details using the structured model
-            output = self.structured_llm.invoke(query)
+            with timed_api_call("groq_llm", schema=self.response_schema.__name__):
+                output = self.structured_llm.invoke(query)
             # Return the structured response
             return {"output": output}
         except Exception as e:
             print(f"Error during extraction: {e}")
             return {"output": None}
 
+    async def _aextract_structured_info(self, state: dict):
+        """
+        Async counterpart of `_extract_structured_info`.
+        """
+        query = state['messages'][-1].content
+        print(f"Processing query: {query}")
+        try:
+            with timed_api_call("groq_llm", schema=self.response_schema.__name__):
+                output = await self.structured_llm.ainvoke(query)
+            return {"output": output}
+        except Exception as e:
+            print(f"Error during extraction: {e}")
+            return {"output": None}
+
+    @staticmethod
+    def _graph_input(query: str) -> dict:
+        return {"messages": [SystemMessage(content=query)]}
+
     def extract(self, query: str) -> Optional[BaseModel]:
         """
         Public method to extract structured information.
@@ -70,15 +96,52 @@ class StructuredOutputExtractor:
         :param query: Input query for structured output extraction
         :return: Structured model object or None
         """
-        from langchain_core.messages import SystemMessage
-
-        result = self.graph.invoke({
-            "messages": [SystemMessage(content=query)]
-        })
+        result = self.graph.invoke(self._graph_input(query))
         # Return the structured model response, if available
         result = result.get('output')
         return result
 
+    async def aextract(self, query: str) -> Optional[BaseModel]:
+        """
+        Async version of `extract`, for callers already running an event loop.
+        
+        :param query: Input query for structured output extraction
+        :return: Structured model object or None
+        """
+        result = await self.graph.ainvoke(self._graph_input(query))
+        return result.get('output')
+
+    def batch_extract(self, queries: List[str], max_concurrency: int = constants.LLM_BATCH_CONCURRENCY) -> List[Optional[BaseModel]]:
+        """
+        Run several queries concurrently through the same graph.
+        
+        :param queries: Input queries for structured output extraction
+        :param max_concurrency: Queries in flight at the same time
+        :return: One structured model object or None per query, in input order
+        """
+        if not queries:
+            return []
+        results = self.graph.batch(
+            [self._graph_input(query) for query in queries],
+            config={"max_concurrency": max(1, int(max_concurrency))},
+        )
+        return [result.get('output') for result in results]
+
+
+_extractors: Dict[Type[BaseModel], StructuredOutputExtractor] = {}
+_extractors_lock = threading.Lock()
+
+
+def get_extractor(response_schema: Type[BaseModel]) -> StructuredOutputExtractor:
+    """
+    Return the extractor for `response_schema`, built once and shared by every session in the process.
+    """
+    with _extractors_lock:
+        extractor = _extractors.get(response_schema)
+        if extractor is None:
+            extractor = _extractors[response_schema] = StructuredOutputExtractor(response_schema)
+        return extractor
+
 
 if __name__ == '__main__':
         
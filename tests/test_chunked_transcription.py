@@ -0,0 +1,66 @@
+import numpy as np
+
+from audio_preprocessing import SAMPLE_RATE
+from chunked_transcription import AudioChunk, find_cut_points, merge_chunk_transcriptions
+
+
+def _noise(seconds, seed=0):
+    return (np.random.default_rng(seed).standard_normal(int(seconds * SAMPLE_RATE)) * 8000).astype(np.int16)
+
+
+def _segments(*items):
+    return {"segments": [{"start": start, "end": end, "text": f" {text}"} for start, end, text in items]}
+
+
+def test_cut_lands_in_the_pause_before_the_target():
+    samples = _noise(30)
+    samples[int(8.0 * SAMPLE_RATE):int(8.5 * SAMPLE_RATE)] = 0
+
+    cuts = find_cut_points(samples, chunk_seconds=10, search_seconds=5)
+
+    assert 8.0 <= cuts[0] <= 8.5
+    assert all(later - earlier <= 10 for earlier, later in zip([0.0] + cuts, cuts + [30.0]))
+
+
+def test_audio_within_one_chunk_is_not_cut():
+    assert find_cut_points(_noise(9.5), chunk_seconds=10, search_seconds=5) == []
+
+
+def test_cut_without_a_pause_stays_inside_the_search_window():
+    cuts = find_cut_points(_noise(25), chunk_seconds=10, search_seconds=3)
+
+    assert 7 <= cuts[0] <= 10
+    assert cuts[1] - cuts[0] <= 10
+
+
+def test_overlapping_segments_are_kept_once_by_the_chunk_owning_their_midpoint():
+    chunks = [
+        AudioChunk(0, start=0.0, end=11.0, keep_start=0.0, keep_end=10.0, flac_bytes=b""),
+        AudioChunk(1, start=9.0, end=20.0, keep_start=10.0, keep_end=20.0, flac_bytes=b""),
+    ]
+    transcriptions = [
+        _segments((0.0, 4.0, "a"), (4.0, 8.0, "b"), (8.0, 9.8, "c"), (9.6, 11.0, "d")),
+        # Times are relative to the chunk, which starts 9 s into the file
+        _segments((0.0, 0.8, "c"), (0.6, 2.0, "d"), (2.0, 11.0, "e")),
+    ]
+
+    merged = merge_chunk_transcriptions(chunks, transcriptions)
+
+    assert merged["text"] == "a b c d e"
+    assert [segment["id"] for segment in merged["segments"]] == [0, 1, 2, 3, 4]
+    assert [(segment["start"], segment["end"]) for segment in merged["segments"][3:]] == [(9.6, 11.0), (11.0, 20.0)]
+
+
+def test_last_chunk_keeps_segments_ending_past_its_range():
+    chunks = [
+        AudioChunk(0, start=0.0, end=6.0, keep_start=0.0, keep_end=5.0, flac_bytes=b""),
+        AudioChunk(1, start=4.0, end=10.0, keep_start=5.0, keep_end=10.0, flac_bytes=b""),
+    ]
+    transcriptions = [
+        _segments((0.0, 5.0, "a"), (5.5, 6.0, "b")),
+        _segments((1.0, 5.0, "b"), (5.9, 6.3, "tail")),
+    ]
+
+    merged = merge_chunk_transcriptions(chunks, transcriptions)
+
+    assert merged["text"] == "a b tail"
@@ -0,0 +1,96 @@
+import pytest
+
+import http_session
+from http_session import CircuitBreaker, CircuitOpenError, PooledHTTPClient
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_session.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.is_open
+
+
+def test_opens_after_consecutive_failures_only(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open
+    assert breaker.allow() == (True, False)
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.allow() == (False, False)
+
+
+def test_lets_one_trial_through_after_the_reset_time_and_closes_on_its_success(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    _open(breaker)
+
+    clock[0] += 29
+    assert breaker.allow() == (False, False)
+    clock[0] += 1
+    assert breaker.allow() == (True, True)
+    assert breaker.allow() == (False, False)
+
+    breaker.record_success(trial=True)
+    assert not breaker.is_open
+    assert breaker.allow() == (True, False)
+
+
+def test_failed_trial_opens_the_breaker_for_another_reset_time(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    _open(breaker)
+    clock[0] += 30
+    assert breaker.allow() == (True, True)
+
+    clock[0] += 5
+    breaker.record_failure(trial=True)
+    assert breaker.is_open
+    clock[0] += 29
+    assert breaker.allow() == (False, False)
+    clock[0] += 1
+    assert breaker.allow() == (True, True)
+
+
+def test_a_call_from_before_the_breaker_opened_does_not_end_the_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    _open(breaker)
+    clock[0] += 30
+    assert breaker.allow() == (True, True)
+
+    # A slow request admitted while the breaker was still closed fails now
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow() == (False, False)
+
+    breaker.end_trial()
+    assert breaker.allow() == (True, True)
+
+
+def test_trial_ending_in_an_unexpected_error_lets_the_next_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    client = PooledHTTPClient("test", max_retries=0, breaker=breaker)
+
+    def post(*args, **kwargs):
+        raise TypeError("not a request error")
+
+    client.session.post = post
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        client.post_json("http://localhost/", {})
+
+    clock[0] += 30
+    with pytest.raises(TypeError):
+        client.post_json("http://localhost/", {})
+    assert breaker.allow() == (True, True)
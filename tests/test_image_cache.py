@@ -0,0 +1,73 @@
+import os
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+
+import utils
+from image_cache import ImageCache
+
+
+class _Job:
+    def __init__(self, path):
+        self.path = path
+
+    def result(self, timeout=None):
+        return self.path
+
+    def cancel(self):
+        pass
+
+
+class _Client:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def submit(self, param_0, api_name=None):
+        # One flat colour per prompt, so images can be told apart by their pixels
+        path = os.path.join(self.directory, f"space_{abs(hash(param_0))}.png")
+        Image.new("RGB", (8, 8), _colour(param_0)).save(path)
+        return _Job(path)
+
+
+class _Pool:
+    def __init__(self, directory):
+        self._client = _Client(directory)
+
+    @contextmanager
+    def client(self):
+        yield self._client
+
+    def stats(self):
+        return {}
+
+
+def _colour(prompt):
+    return tuple(ord(c) % 256 for c in (prompt * 3)[-3:])
+
+
+def _pixel(path):
+    with Image.open(path) as image:
+        return tuple(np.asarray(image.convert("RGB"))[0, 0])
+
+
+def test_miss_at_a_path_a_hit_was_materialized_to_leaves_the_cache_intact(tmp_path, monkeypatch):
+    space_dir = tmp_path / "space"
+    space_dir.mkdir()
+    cache = ImageCache(directory=str(tmp_path / "cache"), namespace="test")
+    monkeypatch.setattr(utils, "get_image_client_pool", lambda: _Pool(str(space_dir)))
+    monkeypatch.setattr(utils, "get_image_cache", lambda: cache)
+    output_dir = str(tmp_path / "output")
+
+    # Prompt B is generated once and cached, then hits the cache into output/0.png
+    list(utils.generate_images(["prompt B"], folder_name=str(tmp_path / "first")))
+    [(_, hit_path)] = list(utils.generate_images(["prompt B"], folder_name=output_dir))
+    assert cache.stats()["hits"] == 1
+    assert _pixel(hit_path) == _colour("prompt B")
+
+    # Prompt C misses and is written to the same output/0.png
+    [(_, miss_path)] = list(utils.generate_images(["prompt C"], folder_name=output_dir))
+    assert miss_path == hit_path
+    assert _pixel(miss_path) == _colour("prompt C")
+
+    assert _pixel(cache.get("prompt B")) == _colour("prompt B")
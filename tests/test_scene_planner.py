@@ -0,0 +1,60 @@
+from scene_planner import plan_scenes
+
+_TOPICS = ["lantern river", "castle meadow", "dragon harbor", "forest comet", "tower desert", "glacier market"]
+
+
+def _segments(bounds, texts=None):
+    texts = texts or [_TOPICS[i % len(_TOPICS)] for i in range(len(bounds))]
+    return [{"start": start, "end": end, "text": f" {text}"} for (start, end), text in zip(bounds, texts)]
+
+
+def _every(seconds, count):
+    return [(i * seconds, (i + 1) * seconds) for i in range(count)]
+
+
+def _groups(scenes):
+    return [scene["segment_indices"] for scene in scenes]
+
+
+def test_segments_fill_scenes_up_to_the_target_and_a_short_tail_joins_the_last_scene():
+    scenes = plan_scenes(_segments(_every(3, 10)), target_scene_seconds=8, max_images=None, similarity_threshold=0)
+
+    assert _groups(scenes) == [[0, 1, 2], [3, 4, 5], [6, 7, 8, 9]]
+    assert [scene["id"] for scene in scenes] == [0, 1, 2]
+    assert (scenes[2]["start"], scenes[2]["end"]) == (18, 30)
+    assert scenes[0]["text"] == "lantern river castle meadow dragon harbor"
+
+
+def test_a_tail_of_half_the_target_keeps_its_own_scene():
+    scenes = plan_scenes(_segments(_every(3, 11)), target_scene_seconds=8, max_images=None, similarity_threshold=0)
+
+    assert _groups(scenes) == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9, 10]]
+
+
+def test_similar_segments_stay_in_one_scene_up_to_twice_the_target():
+    segments = _segments(_every(3, 10), texts=["the dragon guards the castle"] * 10)
+
+    scenes = plan_scenes(segments, target_scene_seconds=8, max_images=None, similarity_threshold=0.3)
+
+    assert _groups(scenes) == [[0, 1, 2, 3, 4, 5], [6, 7, 8, 9]]
+
+
+def test_zero_target_keeps_every_segment():
+    scenes = plan_scenes(_segments(_every(3, 4)), target_scene_seconds=0, max_images=None, similarity_threshold=0)
+
+    assert _groups(scenes) == [[0], [1], [2], [3]]
+
+
+def test_image_cap_merges_the_shortest_adjacent_scenes():
+    segments = _segments([(0, 1), (1, 2), (2, 10), (10, 20), (20, 21)])
+
+    scenes = plan_scenes(segments, target_scene_seconds=0, max_images=3, similarity_threshold=0)
+
+    # Scenes last 1, 1, 8, 10 and 1 s: the first two merge (2 s), then that pair with the 8 s scene (10 s),
+    # which is shorter than the 10 s scene with the 1 s tail (11 s)
+    assert _groups(scenes) == [[0, 1, 2], [3], [4]]
+    assert (scenes[0]["start"], scenes[-1]["end"]) == (0, 21)
+
+
+def test_no_segments_plan_no_scenes():
+    assert plan_scenes([]) == []
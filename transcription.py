@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+from cachetools import TTLCache
+
+import constants
+from audio_preprocessing import compact_audio
+from instrumentation import record_cache, timed_api_call
+
+logger = logging.getLogger(__name__)
+
+# Shared by every session in the process, so the same audio is only sent to Whisper once
+_transcription_cache = TTLCache(maxsize=constants.TRANSCRIPTION_CACHE_SIZE, ttl=constants.TRANSCRIPTION_CACHE_TTL)
+_transcription_cache_lock = threading.Lock()
+
+
+def _cache_key(content_hash: str, params: dict) -> str:
+    digest = hashlib.sha256(content_hash.encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def transcription_params(
+    model: str = constants.TRANSCRIPTION_MODEL,
+    prompt: str = constants.TRANSCRIPTION_PROMPT,
+    temperature: float = 0.0,
+) -> dict:
+    """
+    Request parameters of a transcription, which are also part of its cache key.
+    """
+    return {"model": model, "prompt": prompt, "temperature": temperature, "response_format": "verbose_json"}
+
+
+def get_cached_transcription(content_hash: str, params: dict) -> Optional[dict]:
+    """
+    Transcript of the audio with SHA-256 `content_hash` made with `params`, or None if it is not cached.
+    """
+    with _transcription_cache_lock:
+        cached = _transcription_cache.get(_cache_key(content_hash, params))
+    record_cache("transcription", cached is not None)
+    if cached is None:
+        return None
+    logger.info("Transcription served from cache.")
+    return {"text": cached["text"], "segments": list(cached["segments"])}
+
+
+def cache_transcription(content_hash: str, params: dict, transcription: dict):
+    with _transcription_cache_lock:
+        _transcription_cache[_cache_key(content_hash, params)] = {
+            "text": transcription["text"], "segments": list(transcription["segments"]),
+        }
+
+
+def transcribe_audio(
+    client,
+    file_name: str,
+    file_bytes: bytes,
+    model: str = constants.TRANSCRIPTION_MODEL,
+    prompt: str = constants.TRANSCRIPTION_PROMPT,
+    temperature: float = 0.0,
+    content_hash: Optional[str] = None,
+    preprocess: bool = constants.TRANSCRIPTION_PREPROCESS,
+    file_path: Optional[str] = None,
+    samples: Optional[np.ndarray] = None,
+    use_cache: bool = True,
+) -> dict:
+    """
+    Transcribe audio with the Groq Whisper API, memoized on the audio content and parameters.
+
+    :param client: Groq client used on a cache miss
+    :param file_name: Name of the audio file, used by the API to detect the format
+    :param file_bytes: Raw audio bytes, or a memory-mapped buffer of them
+    :param model: Whisper model to use
+    :param prompt: Optional context for better transcription accuracy
+    :param temperature: Randomness of the transcription output
+    :param content_hash: SHA-256 of `file_bytes` if already known, saves hashing them again
+    :param preprocess: Upload a 16 kHz mono FLAC version when it is smaller than the original
+    :param file_path: Path of the same audio on disk, decoded in place when preprocessing
+    :param samples: The audio already decoded by `decode_audio`, reused when preprocessing
+    :param use_cache: Look the transcript up in and store it to the shared cache
+    :return: Dictionary with the full `text` and the timestamped `segments`
+    """
+    params = transcription_params(model, prompt, temperature)
+    if use_cache:
+        content_hash = content_hash or hashlib.sha256(file_bytes).hexdigest()
+        cached = get_cached_transcription(content_hash, params)
+        if cached is not None:
+            return cached
+
+    if preprocess:
+        # Only the upload is shrunk; the cache key stays that of the original audio
+        compact = compact_audio(file_name, file_bytes, file_path=file_path, samples=samples)
+        file_name, file_bytes = compact.file_name, compact.data
+
+    with timed_api_call("groq_whisper", bytes_out=len(file_bytes)):
+        result = client.audio.transcriptions.create(
+            # Send the audio content directly to the API; a mapped buffer is only copied on a cache miss
+            file=(file_name, file_bytes if isinstance(file_bytes, bytes) else bytes(file_bytes)),
+            **params,
+        )
+    transcription = {"text": result.text, "segments": list(result.segments)}
+    if use_cache:
+        cache_transcription(content_hash, params, transcription)
+    return transcription
+
+
+def transcription_cache_stats() -> dict:
+    with _transcription_cache_lock:
+        return {"entries": _transcription_cache.currsize, "max_entries": _transcription_cache.maxsize}
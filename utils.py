@@ -1,18 +1,46 @@
-import requests
+import re
 import constants
 import os
 from PIL import Image
-from gradio_client import Client
+from gradio_client_pool import get_image_client_pool
+from http_session import get_summarization_client
+from image_cache import get_image_cache
+from ffmpeg_encoder import encode_slideshow, rendition_path, segment_durations, segment_frame_counts
+from frame_preparation import prepare_frames
 import moviepy.editor as mp
 from moviepy.video.VideoClip import ImageClip
 from moviepy.editor import AudioFileClip
-from structured_output_extractor import StructuredOutputExtractor
+from structured_output_extractor import get_extractor
+from image_generation_engine import ImageGenerationEngine, ImageGenerationError
+from instrumentation import record_retry, stage, timed_api_call
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Iterator, List
 import tempfile
 import os
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 
+def fallback_summary(text: str, max_sentences: int = constants.SUMMARY_FALLBACK_SENTENCES) -> str:
+    """
+    Cheap local stand-in for the summarizer: the leading sentences of the transcript.
+    """
+    sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+    return " ".join(sentences[:max_sentences])[:1000]
+
+
+def _summary_from_response(response_data: dict, text: str) -> str:
+    output = response_data.get("output")
+    if not output:
+        print("Summarization response had no output, using the transcript's leading sentences")
+        return fallback_summary(text)
+    print("Returning Summarization")
+    return output
+
+
+@stage("summarization")
 def get_summarization(text: str):
     print('\n\nSummarizing text: ', text, type(text))
     # Input payload
@@ -22,23 +50,29 @@ def get_summarization(text: str):
     headers = {"Authorization": f"Bearer {constants.HF_TOKEN}"}
 
     try:
-        # Make a GET request
-        response = requests.post(constants.SUMMARIZATION_ENDPOINT, json=data, headers=headers)
-        # Process response
-        if response.status_code == 200:
-            response_data = response.json()
-            print("Returning Summarization")
-            return response_data.get("output", "No output found.")
-        else:
-            print("Some Error Occured During Summarization Request")
-            print(response)
-            print(f"Error: {response.status_code}, {response.text}")
-            return {"error_occured" : response.text}
+        # Pooled keep-alive session with timeouts, retries and a circuit breaker
+        response_data = get_summarization_client().post_json(constants.SUMMARIZATION_ENDPOINT, data, headers=headers)
+        return _summary_from_response(response_data, text)
     except Exception as e:
-        print(f"An exception occurred: {e}")
-        return {"error_occured" : e}
+        # A slow or dead summarizer must not stall the pipeline
+        print(f"Summarization failed, using the transcript's leading sentences: {e}")
+        return fallback_summary(text)
+
+
+async def aget_summarization(text: str):
+    """
+    Async version of `get_summarization`, sharing its connection pool and circuit breaker.
+    """
+    data = {"text_input": text}
+    headers = {"Authorization": f"Bearer {constants.HF_TOKEN}"}
+    try:
+        response_data = await get_summarization_client().apost_json(constants.SUMMARIZATION_ENDPOINT, data, headers=headers)
+        return _summary_from_response(response_data, text)
+    except Exception as e:
+        print(f"Summarization failed, using the transcript's leading sentences: {e}")
+        return fallback_summary(text)
     
- 
+
 def segments_to_chunks(segments):
     chunks = []
     for segment in segments:
@@ -46,18 +80,25 @@ def segments_to_chunks(segments):
     return chunks
     
 
-def get_image_prompts(text_input : List, summary):
-    print(f"summary: {summary}")
-        # Example Pydantic model (e.g., Movie)
-    class ImagePromptResponseSchema(BaseModel):
-        image_prompts: List[str] = Field(
-            description="List of detailed image prompts, Each Image Prompt Per Chunk"
-        )
+class ImagePromptResponseSchema(BaseModel):
+    image_prompts: List[str] = Field(
+        description="List of detailed image prompts, Each Image Prompt Per Chunk"
+    )
+
+
+def _image_prompt_query(text_input: List, summary, context: str = "") -> str:
+    """
+    Build the LLM query asking for one image prompt per chunk.
 
-    extractor = StructuredOutputExtractor(response_schema=ImagePromptResponseSchema)
+    :param text_input: Chunks needing a prompt
+    :param summary: Summary of the whole transcript
+    :param context: Transcript text just before the first chunk, for continuity between windows
+    """
     chunks_count = len(text_input)
     chunks = "chunk: " + "\nchunk: ".join(text_input)
-    prompt = f"""
+    if context:
+        context = f" The story so far ends with: \"{context}\" (already illustrated, for continuity only)\n\n"
+    return f"""
 ROLE: You are a Highly Experienced Image Prompt Synthesizer
 SYSTEM PROMPT: Given the Overall Summary and All Chunks of the Text:
 1. Read the summary and the combined context of all chunks (the entire script).
@@ -90,43 +131,196 @@ This text is a story of a man who ventured into a dark jungle and encountered a
 - **Chunk 2:**  
   "[style: 3D | theme: dark jungle] In a clearing within the jungle, a majestic lion appears with an unsettling aura. Its eyes glow faintly in the dim light, and the surrounding trees seem to lean in, enhancing the mysterious tension."
 
-TASK: Here is the summary: {summary}\n\n and \n\n Total of {chunks_count} chunks, generate an Image Prompt for each chunk\n\n {chunks}
+TASK: Here is the summary: {summary}\n\n and \n\n{context} Total of {chunks_count} chunks, generate an Image Prompt for each chunk\n\n {chunks}
 """
-    result = extractor.extract(prompt)
-    return result.model_dump()   # returns dictionary version pydantic model
-    
-    
 
 
+def _fallback_image_prompt(chunk: str) -> str:
+    return f"[style: 3D] {chunk.strip()}"
+
+
+def _fit_prompt_count(prompts: List[str], chunks: List[str]) -> List[str]:
+    """
+    Force exactly one prompt per chunk: extra prompts are dropped, missing ones reuse the chunk text.
+    """
+    prompts = list(prompts[:len(chunks)])
+    for chunk in chunks[len(prompts):]:
+        prompts.append(_fallback_image_prompt(chunk))
+    return prompts
 
-def generate_image(prompt, path='test_image.png'):
-    try:
-        # Initialize the Gradio Client with Hugging Face token
-        client = Client(constants.IMAGE_GENERATION_SPACE_NAME, hf_token=constants.HF_TOKEN)
 
-        # Make the API request
-        result = client.predict(
-            param_0=prompt,  # Text prompt for image generation
-            api_name="/predict"
-        )
+def get_image_prompts(text_input : List, summary, mode=constants.PROMPT_GENERATION_MODE):
+    print(f"summary: {summary}")
+    if mode == "windowed":
+        # Timed as its own prompt_extraction stage
+        return {"image_prompts": get_image_prompts_windowed(text_input, summary)}
+
+    with stage("prompt_extraction"):
+        # Shared extractor: the model client and graph are built once per process
+        extractor = get_extractor(ImagePromptResponseSchema)
+        result = extractor.extract(_image_prompt_query(text_input, summary))
+    return result.model_dump()   # returns dictionary version pydantic model
 
-        image = Image.open(result)
-        image.save(path)
 
-        # Return the result (which includes the URL or file path)
-        return result
+def get_image_prompts_windowed(
+    text_input: List,
+    summary,
+    window_size: int = constants.PROMPT_WINDOW_SIZE,
+    context_chars: int = constants.PROMPT_WINDOW_CONTEXT_CHARS,
+    max_retries: int = constants.PROMPT_WINDOW_MAX_RETRIES,
+    max_concurrency: int = constants.LLM_BATCH_CONCURRENCY,
+) -> List[str]:
+    """
+    Generate image prompts for windows of chunks concurrently, exactly one prompt per chunk.
+    See `iter_image_prompts_windowed` for the parameters.
+
+    :return: List with one image prompt per chunk
+    """
+    return list(iter_image_prompts_windowed(text_input, summary, window_size, context_chars, max_retries, max_concurrency))
+
+
+def iter_image_prompts_windowed(
+    text_input: List,
+    summary,
+    window_size: int = constants.PROMPT_WINDOW_SIZE,
+    context_chars: int = constants.PROMPT_WINDOW_CONTEXT_CHARS,
+    max_retries: int = constants.PROMPT_WINDOW_MAX_RETRIES,
+    max_concurrency: int = constants.LLM_BATCH_CONCURRENCY,
+) -> Iterator[str]:
+    """
+    Generate image prompts for windows of chunks concurrently, yielding exactly one prompt per chunk in order.
+
+    A window's prompts are yielded as soon as it and every window before it are
+    answered, so images for the first chunks can be generated while later windows
+    are still being prompted. Each window carries the summary plus the tail of the
+    transcript preceding it, so queries stay small and independent no matter how
+    long the transcript gets. Windows whose answer has the wrong number of prompts
+    are retried; if one still mismatches after `max_retries`, its prompts are
+    truncated or padded with the chunk text.
+
+    :param text_input: Chunks of the transcript, one image each
+    :param summary: Summary of the whole transcript
+    :param window_size: Chunks per LLM query
+    :param context_chars: Characters of preceding transcript sent with each window
+    :param max_retries: Extra attempts for windows returning the wrong prompt count
+    :param max_concurrency: Windows queried at the same time
+    :return: Iterator over one image prompt per chunk
+    """
+    extractor = get_extractor(ImagePromptResponseSchema)
+    window_size = max(1, int(window_size))
+    windows = [text_input[i:i + window_size] for i in range(0, len(text_input), window_size)]
+
+    def _prompt_window(i):
+        context = " ".join(text_input[:i * window_size])[-context_chars:] if context_chars else ""
+        query = _image_prompt_query(windows[i], summary, context=context)
+        window_prompts = None
+        for attempt in range(max_retries + 1):
+            if attempt:
+                print(f"Retrying prompt window {i} with a mismatched prompt count")
+                record_retry("groq_llm")
+            result = extractor.extract(query)
+            if result is not None:
+                window_prompts = result.image_prompts
+                if len(window_prompts) == len(windows[i]):
+                    return window_prompts
+        print(f"Expected {len(windows[i])} image prompts but got {len(window_prompts or [])}, padding with the chunk text")
+        return _fit_prompt_count(window_prompts or [], windows[i])
+
+    with stage("prompt_extraction") as span, \
+            ThreadPoolExecutor(max_workers=max(1, int(max_concurrency)), thread_name_prefix="prompt-window") as executor:
+        futures = [executor.submit(contextvars.copy_context().run, _prompt_window, i) for i in range(len(windows))]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            # The consumer stopped early; drop windows that have not been queried yet
+            for future in futures:
+                future.cancel()
+        span.set(windows=len(windows))
+
+
+def generate_image(prompt, path='test_image.png', timeout=None):
+    try:
+        # Borrow an initialized Gradio Client from the shared pool; it is reconnected if the request fails
+        with get_image_client_pool().client() as client:
+            # Submit the request as a job so a stuck generation can be abandoned after `timeout` seconds
+            job = client.submit(
+                param_0=prompt,  # Text prompt for image generation
+                api_name="/predict"
+            )
+            try:
+                with timed_api_call("image_space"):
+                    result = job.result(timeout=timeout)
+            except FutureTimeoutError:
+                job.cancel()
+                raise TimeoutError(f"Image generation timed out after {timeout}s")
+
+        # Written beside the path and renamed over it, so a file already at `path` is replaced rather than overwritten
+        root, extension = os.path.splitext(path)
+        tmp_path = f"{root}.{uuid.uuid4().hex}.tmp{extension}"
+        try:
+            Image.open(result).save(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        # Return the path of the saved image
+        return path
 
     except Exception as e:
         print(f"Error during image generation: {e}")
-        return {"error": str(e)}
+        raise
     
-def generate_images(image_prompts, folder_name='test_folder'):
+def generate_images(image_prompts, folder_name='test_folder', max_concurrency=constants.IMAGE_GENERATION_CONCURRENCY, timeout=constants.IMAGE_GENERATION_TIMEOUT, use_cache=True):
+    """
+    Generate images concurrently, yielding (prompt, image_path) in prompt order.
+    Failed prompts yield an ImageGenerationError instead of a path.
+    Prompts already in the image cache resolve without a generation request.
+    """
     folder_path = tmp_folder(folder_name)
-    for index, prompt in enumerate(image_prompts):
+    engine = ImageGenerationEngine(max_concurrency=max_concurrency, timeout=timeout)
+    cache = get_image_cache() if use_cache else None
+
+    def _generate(index, prompt, item_timeout):
         print(index, prompt)
-        image_path = generate_image(prompt=prompt, path=f"{folder_path}/{index}.png")
-        yield prompt, image_path
-    
+        path = f"{folder_path}/{index}.png"
+        if cache:
+            cached_path = cache.get(prompt)
+            if cached_path:
+                return cache.materialize(cached_path, path)
+        path = generate_image(prompt=prompt, path=path, timeout=item_timeout)
+        if cache:
+            cache.put(prompt, path)
+        return path
+
+    with stage("image_generation") as span:
+        generated = failed = 0
+        for _, prompt, image_path in engine.run(image_prompts, _generate):
+            generated += 1
+            failed += isinstance(image_path, ImageGenerationError)
+            yield prompt, image_path
+        span.set(images=generated, failed=failed)
+    print(f"Image client pool stats: {get_image_client_pool().stats()}")
+    if cache:
+        print(f"Image cache stats: {cache.stats()}")
+
+
+def successful_image_paths(generated_images):
+    """
+    Map (prompt, image_path) results to usable image paths, one per prompt.
+    A failed image borrows the nearest earlier successful image (or the first later one),
+    so every segment keeps a valid picture and the indices stay aligned.
+    """
+    paths = [None if isinstance(image_path, ImageGenerationError) else image_path for _, image_path in generated_images]
+    fallback = next((path for path in paths if path), None)
+    resolved = []
+    for path in paths:
+        if path:
+            fallback = path
+        resolved.append(path or fallback)
+    return [path for path in resolved if path]
+
 
 
 def tmp_folder(folder_name: str) -> str:
@@ -158,82 +352,77 @@ import tempfile
 from moviepy.editor import AudioFileClip, ImageClip, concatenate_videoclips
 
 
-def generate_video(audio_file, images, segments):
-    try:
-        # Save the uploaded audio file to a temporary location
-        file_extension = os.path.splitext(audio_file.name)[1]
-        temp_audio_path = tempfile.NamedTemporaryFile(delete=False, suffix=f"{file_extension}")
-        temp_audio_path.write(audio_file.read())
-        temp_audio_path.close()
+def save_audio_to_temp(audio_file):
+    """
+    Write an uploaded audio file to a temporary file and return its path.
+    """
+    file_extension = os.path.splitext(audio_file.name)[1]
+    # Rewind in case the upload was already read during transcription
+    if hasattr(audio_file, "seek"):
+        audio_file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f"{file_extension}") as temp_audio:
+        temp_audio.write(audio_file.read())
+    return temp_audio.name
 
-        # Load the audio file using MoviePy
-        audio = AudioFileClip(temp_audio_path.name)
+
+def generate_video(audio_file, images, segments, backend=constants.VIDEO_ENCODER_BACKEND, output_path=None, renditions=()):
+    """
+    Render the images over their segments with the audio as an MP4.
+
+    :param audio_file: Path of the audio on disk, or an uploaded file object which is spooled to a temporary file
+
+    :param backend: "ffmpeg" encodes the stills directly with ffmpeg, "moviepy" composites every frame with MoviePy
+    :param output_path: Where to write the video, defaults to generated_video.mp4 in the temp directory
+    :param renditions: Extra sizes from `ffmpeg_encoder.RENDITIONS`, written next to the video by the same ffmpeg run
+        (see `rendition_path`); the moviepy backend ignores them
+    """
+    try:
+        # Audio already on disk is used in place; an uploaded file object is saved to a temporary location
+        owns_audio = not isinstance(audio_file, (str, os.PathLike))
+        temp_audio_path = save_audio_to_temp(audio_file) if owns_audio else os.fspath(audio_file)
 
         # Define YouTube-like dimensions (16:9 aspect ratio)
         frame_width = 1280
         frame_height = 720
 
-        video_clips = []
+        durations = segment_durations(segments)
         total_segments = len(segments)
+        segment_images = []
 
         for i, current_segment in enumerate(segments):
-            start_time = current_segment["start"]
-            end_time = current_segment["end"]
-            
-            # Calculate the actual duration including any gap until the next segment
-            if i < total_segments - 1:
-                # If there's a next segment, extend until it starts
-                next_segment = segments[i + 1]
-                actual_end_time = next_segment["start"]
-            else:
-                # For the last segment, use its end time
-                actual_end_time = end_time
-            
-            # Calculate total duration including any gap
-            segment_duration = actual_end_time - start_time
-            
             print(f"\nProcessing segment {i + 1}/{total_segments}:")
-            print(f"  Start time: {start_time}s")
-            print(f"  Base end time: {end_time}s")
-            print(f"  Actual end time: {actual_end_time}s")
-            print(f"  Total duration: {segment_duration}s")
+            print(f"  Start time: {current_segment['start']}s")
+            print(f"  Base end time: {current_segment['end']}s")
+            print(f"  Total duration: {durations[i]}s")
             print(f"  Text: '{current_segment['text']}'")
-            
-            # Ensure the image index is within bounds
-            image_path = images[min(i, len(images) - 1)]
-            
-            # Create an ImageClip for the current segment
-            image_clip = ImageClip(image_path)
-            
-            # Resize and pad the image to fit a 16:9 aspect ratio
-            image_clip = image_clip.resize(height=frame_height).on_color(
-                size=(frame_width, frame_height),
-                color=(0, 0, 0),  # Black background
-                pos="center"      # Center the image
-            )
-            
-            # Set the duration and start time for the clip
-            image_clip = image_clip.set_duration(segment_duration)
-            image_clip = image_clip.set_start(start_time)  # Set the start time explicitly
-            
-            video_clips.append(image_clip)
 
-        # Concatenate all the image clips to form the video
-        print("Concatenating video clips...")
-        video = concatenate_videoclips(video_clips, method="compose")
+            # Ensure the image index is within bounds
+            segment_images.append(images[min(i, len(images) - 1)])
 
-        # Add the audio to the video
-        video = video.set_audio(audio)
+        # Decode and letterbox each distinct image once; segments reusing an image share its frame
+        prepared_frames = prepare_frames(segment_images, width=frame_width, height=frame_height)
+        print(f"Prepared {len(prepared_frames.frames)} unique frames ({prepared_frames.nbytes / 1e6:.1f} MB) for {total_segments} segments")
 
         # Save the video to a temporary file
         temp_dir = tempfile.gettempdir()
-        video_path = os.path.join(temp_dir, "generated_video.mp4")
-        print(f"Writing video file to {video_path}...")
-        video.write_videofile(video_path, fps=30, codec="libx264", audio_codec="aac")
+        video_path = output_path or os.path.join(temp_dir, "generated_video.mp4")
+        print(f"Writing video file to {video_path} with the {backend} backend...")
+
+        with stage("encode", backend=backend) as span:
+            if backend == "ffmpeg":
+                encode_slideshow(prepared_frames, durations, temp_audio_path, video_path, fps=30, renditions=renditions)
+                for rendition in renditions:
+                    print(f"Wrote the {rendition.name} rendition to {rendition_path(video_path, rendition.name)}")
+            elif backend == "moviepy":
+                _render_with_moviepy(prepared_frames, durations, segments, temp_audio_path, video_path)
+            else:
+                raise ValueError(f"Unknown video encoder backend: {backend}")
+            span.set(segments=total_segments, frames=sum(segment_frame_counts(durations, 30)), bytes_out=os.path.getsize(video_path))
 
         # Clean up the temporary audio file
-        os.remove(temp_audio_path.name)
-        print("Temporary audio file removed.")
+        if owns_audio:
+            os.remove(temp_audio_path)
+            print("Temporary audio file removed.")
 
         return video_path
 
@@ -242,6 +431,30 @@ def generate_video(audio_file, images, segments):
         return None
 
 
+def _render_with_moviepy(prepared_frames, durations, segments, audio_path, video_path):
+    # Load the audio file using MoviePy
+    audio = AudioFileClip(audio_path)
+
+    video_clips = []
+    for i, (segment_duration, current_segment) in enumerate(zip(durations, segments)):
+        # The prepared frame is already letterboxed to the 16:9 canvas
+        image_clip = ImageClip(prepared_frames.frame_for(i))
+
+        # Set the duration and start time for the clip
+        image_clip = image_clip.set_duration(segment_duration)
+        image_clip = image_clip.set_start(current_segment["start"])  # Set the start time explicitly
+
+        video_clips.append(image_clip)
+
+    # Concatenate all the image clips to form the video
+    print("Concatenating video clips...")
+    video = concatenate_videoclips(video_clips, method="compose")
+
+    # Add the audio to the video
+    video = video.set_audio(audio)
+    video.write_videofile(video_path, fps=30, codec="libx264", audio_codec="aac")
+
+
 
 
 